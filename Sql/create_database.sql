@@ -136,6 +136,11 @@ CREATE INDEX idx_result_race ON Result(race_id);
 CREATE INDEX idx_result_driver ON Result(driver_id);
 CREATE INDEX idx_result_team ON Result(team_id);
 CREATE INDEX idx_result_position ON Result(position);
+CREATE INDEX idx_result_driver_race ON Result(driver_id, race_id);
+CREATE INDEX idx_result_driver_pos ON Result(driver_id, position, race_id);
+CREATE INDEX idx_result_driver_team ON Result(driver_id, team_id, race_id);
+CREATE INDEX idx_result_race_team ON Result(race_id, team_id, driver_id);
+CREATE INDEX idx_race_id_date ON Race(race_id, race_date);
 CREATE INDEX idx_additional_race ON Additional_Results(race_id);
 CREATE INDEX idx_additional_driver ON Additional_Results(driver_id);
 CREATE INDEX idx_additional_team ON Additional_Results(team_id);
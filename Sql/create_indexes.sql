@@ -0,0 +1,21 @@
+-- Indexes used by the web application's ranking queries.
+-- Safe to run repeatedly: calculate_driver_elo.py applies this script after
+-- every ELO run (the web app only opens the database read-only).
+
+-- Latest team per driver: walk a driver's results in race order
+CREATE INDEX IF NOT EXISTS idx_result_driver_race ON Result(driver_id, race_id);
+CREATE INDEX IF NOT EXISTS idx_race_id_date ON Race(race_id, race_date);
+
+-- Covering indexes for per-driver aggregates: wins/podiums read position and
+-- latest-team lookups read team_id straight from the index, no table lookups.
+-- Race(season_year) already covers race_id, as race_id is the rowid.
+CREATE INDEX IF NOT EXISTS idx_result_driver_pos ON Result(driver_id, position, race_id);
+CREATE INDEX IF NOT EXISTS idx_result_driver_team ON Result(driver_id, team_id, race_id);
+
+-- The ELO pipeline reads every result in (race, team, driver) order: walking
+-- this index avoids a temp B-tree sort (calculate_driver_elo.py also creates
+-- it before the bulk load)
+CREATE INDEX IF NOT EXISTS idx_result_race_team ON Result(race_id, team_id, driver_id);
+
+-- Refresh planner statistics so the new indexes are actually chosen
+ANALYZE;
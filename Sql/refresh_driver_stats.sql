@@ -0,0 +1,48 @@
+-- Materialized per-driver career statistics for the rankings page.
+-- Rebuilt by calculate_driver_elo.py after every ELO run (run it after
+-- import_data.py), so requests join one keyed table instead of aggregating
+-- the whole Result table each time. Until the table exists, app.py reads the
+-- same columns from a live aggregate over Result (_LIVE_DRIVER_STATS).
+
+BEGIN;
+
+DROP TABLE IF EXISTS Driver_Stats;
+
+CREATE TABLE Driver_Stats (
+    driver_id INTEGER PRIMARY KEY,
+    total_races INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    podiums INTEGER NOT NULL DEFAULT 0,
+    current_team_id INTEGER,
+    last_race_date DATE
+);
+
+INSERT INTO Driver_Stats (driver_id, total_races, wins, podiums, current_team_id, last_race_date)
+WITH career AS (
+    SELECT
+        res.driver_id,
+        COUNT(DISTINCT res.race_id) as total_races,
+        SUM(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) as wins,
+        SUM(CASE WHEN res.position BETWEEN 1 AND 3 THEN 1 ELSE 0 END) as podiums,
+        MAX(r.race_date) as last_race_date
+    FROM Result res
+    JOIN Race r ON res.race_id = r.race_id
+    GROUP BY res.driver_id
+),
+latest_team AS (
+    SELECT driver_id, team_id
+    FROM (
+        SELECT
+            res.driver_id,
+            res.team_id,
+            ROW_NUMBER() OVER (PARTITION BY res.driver_id ORDER BY r.race_date DESC) as rn
+        FROM Result res
+        JOIN Race r ON res.race_id = r.race_id
+    )
+    WHERE rn = 1
+)
+SELECT c.driver_id, c.total_races, c.wins, c.podiums, lt.team_id, c.last_race_date
+FROM career c
+LEFT JOIN latest_team lt ON c.driver_id = lt.driver_id;
+
+COMMIT;
@@ -4,97 +4,100 @@ Flask backend to serve driver rankings based on ELO ratings
 """
 
 from flask import Flask, render_template, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from functools import lru_cache
+import gzip
+import orjson
+import os
 import sqlite3
-import pandas as pd
+import threading
+import time
 from datetime import datetime
+from config import (DB_PATH, CENTURY_START_YEAR, ALL_TIME_START_YEAR, CURRENT_SEASON,
+                    DEBUG, HOST, PORT, open_db)
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson's C encoder, used by jsonify() and
+    app.json.dumps() - the rankings payloads are hundreds of rows
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
-DB_PATH = 'DB/f1_database.db'
+_thread_local = threading.local()
 
 def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    Get this thread's read-only database connection, opening it on first use.
+    Reusing the connection keeps SQLite's page and statement caches warm
+    across requests, so handlers must not close it.
+    """
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        conn = open_db(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        _thread_local.conn = conn
     return conn
 
-def get_driver_rankings(season_filter='all'):
+def get_data_version():
     """
-    Get driver rankings with ELO scores - OPTIMIZED VERSION
-    
-    Args:
-        season_filter: 'current' (2024), 'century' (2000-2024), 'all' (all-time)
+    Cheap fingerprint of the database file, used as a cache key.
+    Any write (new race import or ELO recalculation) changes it.
     """
+    stat = os.stat(DB_PATH)
+    version = (stat.st_mtime_ns, stat.st_size)
+    
+    # In WAL mode committed writes land in the -wal file until a checkpoint
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if Driver_Elo table exists (case-sensitive check)
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND (name='driver_elo' OR name='Driver_Elo')
-        """)
-        
-        table_result = cursor.fetchone()
-        if not table_result:
-            print("Warning: Driver_Elo table not found. Please run ELO calculation first.")
-            conn.close()
-            return []
-        
-        # Use the actual table name found
-        elo_table = table_result[0]
-        
-        # Determine which ELO to use and year filter based on era
-        if season_filter == 'current':
-            # Latest season - use era_adjusted_elo, filter by 2024 participation
-            elo_column = "de.era_adjusted_elo"
-            year_filter = """
-                AND EXISTS (
-                    SELECT 1 FROM Result r 
-                    JOIN Race ra ON r.race_id = ra.race_id 
-                    WHERE r.driver_id = d.driver_id AND ra.season_year = 2024
-                )
-            """
-            order_by = "de.era_adjusted_elo DESC"
-            
-        elif season_filter == 'century':
-            # Modern era (2000+) - use era_adjusted_elo, filter by debut year
-            elo_column = "de.era_adjusted_elo"
-            year_filter = "AND de.debut_year >= 2000"
-            order_by = "de.era_adjusted_elo DESC"
-            
-        else:
-            # All time - use raw global_elo for fair historical comparison
-            elo_column = "de.global_elo"
-            year_filter = ""
-            order_by = "de.global_elo DESC"
-        
-        # OPTIMIZED: Single query with aggregations instead of multiple subqueries
-        query = f"""
-        WITH driver_stats AS (
-            SELECT 
-                res.driver_id,
-                COUNT(DISTINCT res.race_id) as total_races,
-                SUM(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) as wins,
-                SUM(CASE WHEN res.position <= 3 AND res.position > 0 THEN 1 ELSE 0 END) as podiums,
-                MAX(r.race_date) as last_race_date,
-                (
-                    SELECT t.team_name 
-                    FROM Result res2
-                    JOIN Team t ON res2.team_id = t.team_id
-                    JOIN Race r2 ON res2.race_id = r2.race_id
-                    WHERE res2.driver_id = res.driver_id
-                    ORDER BY r2.race_date DESC
-                    LIMIT 1
-                ) as current_team
-            FROM Result res
-            JOIN Race r ON res.race_id = r.race_id
-            GROUP BY res.driver_id
-        )
+        wal_stat = os.stat(DB_PATH + '-wal')
+        version += (wal_stat.st_mtime_ns, wal_stat.st_size)
+    except FileNotFoundError:
+        pass
+    
+    return version
+
+def get_table_names():
+    """Map lower-cased table names to their actual names in the database"""
+    try:
+        conn = open_db(DB_PATH)
+        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tables = {name.lower(): name for (name,) in cursor.fetchall()}
+        conn.close()
+        return tables
+    except Exception as e:
+        print(f"Warning: could not read database schema: {str(e)}")
+        return {}
+
+def get_journal_mode():
+    """The database's journal mode ('wal' once an import or ELO run has converted it)"""
+    try:
+        conn = open_db(DB_PATH)
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        return journal_mode
+    except Exception as e:
+        print(f"Warning: could not read database journal mode: {str(e)}")
+        return None
+
+# Ranking queries are fixed strings so sqlite3's statement cache (keyed on the
+# exact SQL text) reuses the compiled plan on every request.
+_RANKINGS_QUERY = """
         SELECT 
             d.driver_id as driverId,
-            d.first_name || ' ' || d.last_name as driver_name,
-            SUBSTR(UPPER(d.last_name), 1, 3) as driver_code,
+            d.first_name,
+            d.last_name,
             d.nationality,
             de.qualifying_elo,
             de.race_elo,
@@ -104,64 +107,96 @@ def get_driver_rankings(season_filter='all'):
             de.qualifying_races,
             de.race_races,
             de.debut_year,
-            COALESCE(ds.current_team, 'Unknown') as current_team,
+            COALESCE(t.team_name, 'Unknown') as current_team,
             COALESCE(ds.total_races, 0) as total_races,
             COALESCE(ds.wins, 0) as wins,
             COALESCE(ds.podiums, 0) as podiums
         FROM Driver d
-        INNER JOIN {elo_table} de ON d.driver_id = de.driver_id
-        LEFT JOIN driver_stats ds ON d.driver_id = ds.driver_id
+        INNER JOIN Driver_Elo de ON d.driver_id = de.driver_id
+        LEFT JOIN {driver_stats} ds ON d.driver_id = ds.driver_id
+        LEFT JOIN Team t ON ds.current_team_id = t.team_id
         WHERE de.global_elo IS NOT NULL
         {year_filter}
         ORDER BY {order_by}
         """
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # Rename display_elo to global_elo for frontend consistency
-        if 'display_elo' in df.columns:
-            df['global_elo'] = df['display_elo']
-        
-        return df.to_dict('records')
-        
-    except Exception as e:
-        print(f"Error fetching rankings: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return []
 
-def get_driver_rankings_by_year(year):
+_RANKINGS_FILTERS = {
+    # Latest season - use era_adjusted_elo, filter by participation in the
+    # most recent season in the database (no hardcoded year to bump each
+    # winter). The uncorrelated IN list is built once per query (a small set
+    # of ~20 drivers) instead of probing Result for every ranked driver.
+    'current': {
+        'elo_column': "de.era_adjusted_elo",
+        'year_filter': """
+        AND d.driver_id IN (
+            SELECT r.driver_id FROM Result r 
+            JOIN Race ra ON r.race_id = ra.race_id 
+            WHERE ra.season_year = (SELECT MAX(season_year) FROM Race)
+        )
+    """,
+        'order_by': "de.era_adjusted_elo DESC",
+    },
+    # Modern era (2000+) - use era_adjusted_elo, filter by debut year
+    'century': {
+        'elo_column': "de.era_adjusted_elo",
+        'year_filter': f"AND de.debut_year >= {CENTURY_START_YEAR:d}",
+        'order_by': "de.era_adjusted_elo DESC",
+    },
+    # All time - use raw global_elo for fair historical comparison
+    'all': {
+        'elo_column': "de.global_elo",
+        'year_filter': "",
+        'order_by': "de.global_elo DESC",
+    },
+}
+
+# Career stats computed from Result on every query - the same columns as
+# Sql/refresh_driver_stats.sql, used until the ELO pipeline has built the
+# materialized Driver_Stats table
+_LIVE_DRIVER_STATS = """(
+            WITH career AS (
+                SELECT
+                    res.driver_id,
+                    COUNT(DISTINCT res.race_id) as total_races,
+                    SUM(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) as wins,
+                    SUM(CASE WHEN res.position BETWEEN 1 AND 3 THEN 1 ELSE 0 END) as podiums
+                FROM Result res
+                GROUP BY res.driver_id
+            ),
+            latest_team AS (
+                SELECT driver_id, team_id
+                FROM (
+                    SELECT
+                        res.driver_id,
+                        res.team_id,
+                        ROW_NUMBER() OVER (PARTITION BY res.driver_id ORDER BY r.race_date DESC) as rn
+                    FROM Result res
+                    JOIN Race r ON res.race_id = r.race_id
+                )
+                WHERE rn = 1
+            )
+            SELECT c.driver_id, c.total_races, c.wins, c.podiums, lt.team_id as current_team_id
+            FROM career c
+            LEFT JOIN latest_team lt ON c.driver_id = lt.driver_id
+        )"""
+
+def build_rankings_queries(driver_stats):
     """
-    Get driver rankings for a specific year using historical ELO snapshots
-    Shows drivers who raced in that year with their ELO at the end of that season
-    
-    Args:
-        year: Specific year to filter by
+    Ranking query per season filter, reading career stats from driver_stats
+    (the Driver_Stats table, or the live aggregate subquery)
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if Driver_Elo_History table exists
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='Driver_Elo_History'
-        """)
-        
-        if not cursor.fetchone():
-            print("Warning: Driver_Elo_History table not found.")
-            conn.close()
-            return []
-        
-        # OPTIMIZED: Single query with CTE for year-specific stats
-        query = """
+    return {
+        season_filter: _RANKINGS_QUERY.format(driver_stats=driver_stats, **parts)
+        for season_filter, parts in _RANKINGS_FILTERS.items()
+    }
+
+_QUERY_BY_YEAR = """
         WITH year_stats AS (
             SELECT 
                 res.driver_id,
                 COUNT(DISTINCT res.race_id) as total_races,
                 SUM(CASE WHEN res.position = 1 THEN 1 ELSE 0 END) as wins,
-                SUM(CASE WHEN res.position <= 3 AND res.position > 0 THEN 1 ELSE 0 END) as podiums
+                SUM(CASE WHEN res.position BETWEEN 1 AND 3 THEN 1 ELSE 0 END) as podiums
             FROM Result res
             JOIN Race r ON res.race_id = r.race_id
             WHERE r.season_year = ?
@@ -181,8 +216,8 @@ def get_driver_rankings_by_year(year):
         )
         SELECT 
             d.driver_id as driverId,
-            d.first_name || ' ' || d.last_name as driver_name,
-            SUBSTR(UPPER(d.last_name), 1, 3) as driver_code,
+            d.first_name,
+            d.last_name,
             d.nationality,
             deh.qualifying_elo,
             deh.race_elo,
@@ -199,17 +234,74 @@ def get_driver_rankings_by_year(year):
         AND ys.driver_id IS NOT NULL
         ORDER BY deh.global_elo DESC
         """
-        
-        df = pd.read_sql_query(query, conn, params=(year, year, year))
-        conn.close()
-        
-        return df.to_dict('records')
-        
-    except Exception as e:
-        print(f"Error fetching rankings for year {year}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+
+def driver_row(row):
+    """
+    Convert a ranking result row to a dict, deriving the display name and
+    3-letter driver code in Python rather than in SQL
+    """
+    driver = dict(row)
+    first_name = driver.pop('first_name')
+    last_name = driver.pop('last_name')
+    driver['driver_name'] = f"{first_name} {last_name}"
+    driver['driver_code'] = last_name[:3].upper()
+    return driver
+
+def get_driver_rankings(season_filter='all'):
+    """
+    Get driver rankings with ELO scores - OPTIMIZED VERSION
+    
+    Args:
+        season_filter: 'current' (latest season), 'century' (2000+), 'all' (all-time)
+    
+    Database errors propagate to the caller, so a failed query is never
+    cached as an empty ranking.
+    """
+    if not HAS_DRIVER_ELO:
+        print("Warning: Driver_Elo table not found. Please run ELO calculation first.")
         return []
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Career stats come from the materialized Driver_Stats table
+    # (see Sql/refresh_driver_stats.sql), so no aggregation over Result
+    # here once the ELO pipeline has built it
+    cursor.execute(_RANKINGS_QUERIES.get(season_filter, _RANKINGS_QUERIES['all']))
+    rankings = [driver_row(row) for row in cursor.fetchall()]
+    
+    # Rename display_elo to global_elo for frontend consistency
+    for row in rankings:
+        row['global_elo'] = row['display_elo']
+    
+    return rankings
+
+def get_driver_rankings_by_year(year):
+    """
+    Get driver rankings for a specific year using historical ELO snapshots
+    Shows drivers who raced in that year with their ELO at the end of that season
+    
+    Args:
+        year: Specific year to filter by
+    
+    Database errors propagate to the caller (see get_driver_rankings).
+    """
+    if not HAS_ELO_HISTORY:
+        print("Warning: Driver_Elo_History table not found.")
+        return []
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(_QUERY_BY_YEAR, (year, year, year))
+    rankings = [driver_row(row) for row in cursor.fetchall()]
+    
+    return rankings
+
+@lru_cache(maxsize=1)
+def get_team_colors_body():
+    """Serialized team colors - a constant table, so encoded only once"""
+    return app.json.dumps(get_team_colors()).encode('utf-8')
 
 def get_team_colors():
     """Get team colors for styling"""
@@ -226,10 +318,64 @@ def get_team_colors():
         'haas': {'primary': '#FFFFFF', 'secondary': '#B6BABD'},
     }
 
+def get_season_labels():
+    """
+    First and latest season in the database, plus the modern era start, for
+    the filter subtitles (config defaults if the database cannot be read)
+    """
+    try:
+        years = get_years(get_data_version())
+        first_season, latest_season = years[-1], years[0]
+    except Exception as e:
+        print(f"Warning: could not read seasons: {str(e)}")
+        first_season, latest_season = ALL_TIME_START_YEAR, CURRENT_SEASON
+    return {
+        'first_season': first_season,
+        'latest_season': latest_season,
+        'century_start': CENTURY_START_YEAR,
+    }
+
 @app.route('/')
 def index():
     """Main page"""
-    return render_template('index.html')
+    return render_template('index.html', **get_season_labels())
+
+@lru_cache(maxsize=128)
+def get_rankings_body(season_filter, year, data_version):
+    """
+    Serialized /api/rankings response body, cached per filter/year until
+    the database changes (data_version is part of the cache key). Errors
+    are raised, not returned: lru_cache does not store exceptions, so the
+    next request retries the query.
+    """
+    if season_filter == 'year':
+        rankings = get_driver_rankings_by_year(year)
+        payload = {
+            'success': True,
+            'filter': 'year',
+            'year': year,
+            'count': len(rankings),
+            'rankings': rankings
+        }
+    else:
+        rankings = get_driver_rankings(season_filter)
+        payload = {
+            'success': True,
+            'filter': season_filter,
+            'count': len(rankings),
+            'rankings': rankings
+        }
+    
+    return app.json.dumps(payload).encode('utf-8')
+
+@lru_cache(maxsize=128)
+def get_rankings_body_gzip(season_filter, year, data_version):
+    """
+    Gzipped rankings body - the JSON repeats the same keys and team names on
+    every row, so it shrinks several times over. Compressed once per cache
+    entry, so the highest level costs nothing per request.
+    """
+    return gzip.compress(get_rankings_body(season_filter, year, data_version), compresslevel=9)
 
 @app.route('/api/rankings')
 def api_rankings():
@@ -237,44 +383,58 @@ def api_rankings():
     season_filter = request.args.get('filter', 'all')
     year = request.args.get('year', None)
     
-    # Handle specific year filter
     if season_filter == 'year' and year:
-        rankings = get_driver_rankings_by_year(int(year))
-        return jsonify({
-            'success': True,
-            'filter': 'year',
-            'year': int(year),
-            'count': len(rankings),
-            'rankings': rankings
-        })
+        # Specific year filter
+        year = int(year)
+    else:
+        # Regular filters
+        if season_filter not in ['current', 'century', 'all']:
+            season_filter = 'all'
+        year = None
     
-    # Handle regular filters
-    if season_filter not in ['current', 'century', 'all']:
-        season_filter = 'all'
+    try:
+        data_version = get_data_version()
+        if request.accept_encodings['gzip'] > 0:
+            response = app.response_class(
+                get_rankings_body_gzip(season_filter, year, data_version),
+                mimetype='application/json'
+            )
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = app.response_class(
+                get_rankings_body(season_filter, year, data_version),
+                mimetype='application/json'
+            )
+    except Exception as e:
+        print(f"Error fetching rankings: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': 'Could not fetch rankings'
+        }), 500
+    response.vary.add('Accept-Encoding')
+    return response
+
+@lru_cache(maxsize=4)
+def get_years(data_version):
+    """
+    Seasons present in the Race table, newest first - cached until the
+    database changes (data_version is part of the cache key)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    rankings = get_driver_rankings(season_filter)
-    return jsonify({
-        'success': True,
-        'filter': season_filter,
-        'count': len(rankings),
-        'rankings': rankings
-    })
+    cursor.execute('SELECT DISTINCT season_year FROM Race ORDER BY season_year DESC')
+    return tuple(row[0] for row in cursor.fetchall())
 
 @app.route('/api/years')
 def api_years():
     """API endpoint to get available years"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT DISTINCT season_year FROM Race ORDER BY season_year DESC')
-        years = [row[0] for row in cursor.fetchall()]
-        
-        conn.close()
-        
         return jsonify({
             'success': True,
-            'years': years
+            'years': get_years(get_data_version())
         })
     except Exception as e:
         print(f"Error fetching years: {str(e)}")
@@ -286,42 +446,42 @@ def api_years():
 @app.route('/api/team-colors')
 def api_team_colors():
     """API endpoint for team colors"""
-    return jsonify(get_team_colors())
+    return app.response_class(get_team_colors_body(), mimetype='application/json')
+
+@lru_cache(maxsize=4)
+def get_last_update_body(data_version, today):
+    """
+    Serialized /api/last-update body, rebuilt only when the database changes
+    or the (UTC) day rolls over, since races are filtered against date('now')
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    if RACE_TABLE:
+        # Get the latest race date from the database
+        cursor.execute(f"""
+            SELECT MAX(race_date) as last_race
+            FROM {RACE_TABLE}
+            WHERE race_date <= date('now')
+        """)
+        result = cursor.fetchone()
+        last_race_date = result['last_race'] if result else None
+    else:
+        # Fallback: use current date
+        last_race_date = "2025-10-24"
+    
+    return app.json.dumps({
+        'last_race_date': last_race_date,
+        'updated_at': datetime.now().isoformat()
+    }).encode('utf-8')
 
 @app.route('/api/last-update')
 def api_last_update():
     """Get last race update timestamp"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if Race table exists (try both cases)
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND (name='races' OR name='Race')
-        """)
-        
-        table_result = cursor.fetchone()
-        if table_result:
-            race_table = table_result[0]
-            # Get the latest race date from the database
-            cursor.execute(f"""
-                SELECT MAX(race_date) as last_race
-                FROM {race_table}
-                WHERE race_date <= date('now')
-            """)
-            result = cursor.fetchone()
-            last_race_date = result['last_race'] if result else None
-        else:
-            # Fallback: use current date
-            last_race_date = "2025-10-24"
-        
-        conn.close()
-        
-        return jsonify({
-            'last_race_date': last_race_date,
-            'updated_at': datetime.now().isoformat()
-        })
+        today = time.strftime('%Y-%m-%d', time.gmtime())
+        body = get_last_update_body(get_data_version(), today)
+        return app.response_class(body, mimetype='application/json')
     except Exception as e:
         print(f"Error in last_update: {str(e)}")
         return jsonify({
@@ -335,7 +495,95 @@ def api_last_update():
 @app.route('/teams')
 def teams_page():
     """Render team rankings page"""
-    return render_template('teams.html')
+    return render_template('teams.html', **get_season_labels())
+
+# Team rankings read the driver-adjusted Glicko-2 table (Team_Elo_Glicko2).
+# For lineages, the name shown is the MOST RECENT team based on latest race
+# activity. Fixed strings, like the driver queries, so the compiled
+# statements are reused; the first season is a bound parameter.
+_TEAM_RANKINGS_QUERY = """
+        WITH TeamActivity AS (
+            -- Activity years for every constructor in one pass over Result
+            SELECT 
+                res.team_id,
+                MIN(r.season_year) as first_year,
+                MAX(r.season_year) as last_year
+            FROM Result res
+            JOIN Race r ON res.race_id = r.race_id
+            GROUP BY res.team_id
+        ),
+        LineageConstructors AS (
+            -- One row per constructor in each lineage, with its activity years
+            SELECT 
+                teg.lineage_id,
+                CAST(constructor.value AS INTEGER) as constructor_id,
+                ta.first_year,
+                ta.last_year
+            FROM Team_Elo_Glicko2 teg,
+                 json_each('["' || replace(teg.constructor_ids, ',', '","') || '"]') as constructor
+            LEFT JOIN TeamActivity ta ON ta.team_id = CAST(constructor.value AS INTEGER)
+        ),
+        LatestTeamInLineage AS (
+            SELECT 
+                teg.lineage_id,
+                teg.constructor_ids,
+                teg.qualifying_rating,
+                teg.race_rating,
+                teg.global_rating,
+                teg.conservative_rating,
+                teg.total_races,
+                teg.avg_rd,
+                -- The constructor with the most recent race activity
+                latest.constructor_id as latest_constructor_id
+            FROM Team_Elo_Glicko2 teg
+            LEFT JOIN (
+                SELECT 
+                    lineage_id,
+                    constructor_id,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY lineage_id
+                        ORDER BY last_year DESC, constructor_id DESC
+                    ) as rn
+                FROM LineageConstructors
+            ) latest ON latest.lineage_id = teg.lineage_id AND latest.rn = 1
+        ),
+        LineageActivity AS (
+            -- Activity years across ALL constructors in each lineage
+            SELECT 
+                lineage_id,
+                MIN(first_year) as first_year,
+                MAX(last_year) as last_year
+            FROM LineageConstructors
+            GROUP BY lineage_id
+        )
+        SELECT 
+            lt.lineage_id as team_id,
+            t.team_name,
+            COALESCE(t.base_country, 'Unknown') as base_country,
+            lt.qualifying_rating as qualifying_elo,
+            lt.race_rating as race_elo,
+            lt.global_rating as global_elo,
+            lt.conservative_rating as era_adjusted_elo,
+            lt.total_races,
+            CASE 
+                WHEN lt.avg_rd < 50 THEN 100.0
+                WHEN lt.avg_rd < 100 THEN 90.0
+                WHEN lt.avg_rd < 150 THEN 75.0
+                ELSE 50.0
+            END as reliability_score,
+            COALESCE(t.total_wins, 0) as total_wins,
+            COALESCE(t.total_points, 0) as total_points,
+            COALESCE(la.first_year, 1950) as first_year,
+            COALESCE(la.last_year, 1950) as last_year
+        FROM LatestTeamInLineage lt
+        INNER JOIN Team t ON t.team_id = lt.latest_constructor_id
+        LEFT JOIN LineageActivity la ON la.lineage_id = lt.lineage_id
+    """
+
+# Sort by conservative rating (statistically sound for cross-era comparison)
+_TEAM_QUERY_ALL = _TEAM_RANKINGS_QUERY + " ORDER BY lt.conservative_rating DESC"
+_TEAM_QUERY_SINCE = (_TEAM_RANKINGS_QUERY + " WHERE la.last_year >= ?"
+                     + " ORDER BY lt.conservative_rating DESC")
 
 @app.route('/api/team-rankings')
 def api_team_rankings():
@@ -346,84 +594,42 @@ def api_team_rankings():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Query using the new Team_Elo_Glicko2 table (driver-adjusted Glicko-2)
-        # For lineages, get the MOST RECENT team name based on latest race activity
-        query = """
-            WITH LatestTeamInLineage AS (
-                SELECT 
-                    teg.lineage_id,
-                    teg.constructor_ids,
-                    teg.qualifying_rating,
-                    teg.race_rating,
-                    teg.global_rating,
-                    teg.conservative_rating,
-                    teg.total_races,
-                    teg.avg_rd,
-                    -- Find the constructor with the most recent race activity
-                    (SELECT CAST(constructor.value AS INTEGER)
-                     FROM json_each('["' || replace(teg.constructor_ids, ',', '","') || '"]') as constructor
-                     LEFT JOIN Result res ON res.team_id = CAST(constructor.value AS INTEGER)
-                     LEFT JOIN Race r ON res.race_id = r.race_id
-                     GROUP BY constructor.value
-                     ORDER BY MAX(r.season_year) DESC, CAST(constructor.value AS INTEGER) DESC
-                     LIMIT 1) as latest_constructor_id
-                FROM Team_Elo_Glicko2 teg
-            ),
-            LineageActivity AS (
-                -- Get activity years across ALL constructors in each lineage
-                SELECT 
-                    lt.lineage_id,
-                    MIN(r.season_year) as first_year,
-                    MAX(r.season_year) as last_year
-                FROM LatestTeamInLineage lt,
-                     json_each('["' || replace(lt.constructor_ids, ',', '","') || '"]') as constructor
-                LEFT JOIN Result res ON res.team_id = CAST(constructor.value AS INTEGER)
-                LEFT JOIN Race r ON res.race_id = r.race_id
-                GROUP BY lt.lineage_id
-            )
-            SELECT 
-                lt.lineage_id as team_id,
-                t.team_name,
-                COALESCE(t.base_country, 'Unknown') as base_country,
-                lt.qualifying_rating as qualifying_elo,
-                lt.race_rating as race_elo,
-                lt.global_rating as global_elo,
-                lt.conservative_rating as era_adjusted_elo,
-                lt.total_races,
-                CASE 
-                    WHEN lt.avg_rd < 50 THEN 100.0
-                    WHEN lt.avg_rd < 100 THEN 90.0
-                    WHEN lt.avg_rd < 150 THEN 75.0
-                    ELSE 50.0
-                END as reliability_score,
-                COALESCE(t.total_wins, 0) as total_wins,
-                COALESCE(t.total_points, 0) as total_points,
-                COALESCE(la.first_year, 1950) as first_year,
-                COALESCE(la.last_year, 1950) as last_year
-            FROM LatestTeamInLineage lt
-            INNER JOIN Team t ON t.team_id = lt.latest_constructor_id
-            LEFT JOIN LineageActivity la ON la.lineage_id = lt.lineage_id
-        """
-        
-        # Add filtering based on season
+        # Filter by season: the current filter starts at the latest season
+        # in the database, the century filter at CENTURY_START_YEAR
         if season_filter == 'current':
-            query += " WHERE la.last_year >= 2024"
+            query, params = _TEAM_QUERY_SINCE, (get_years(get_data_version())[0],)
         elif season_filter == 'century':
-            query += " WHERE la.last_year >= 2000"
-        
-        # Sort by conservative rating (statistically sound for cross-era comparison)
-        query += " ORDER BY lt.conservative_rating DESC"
+            query, params = _TEAM_QUERY_SINCE, (CENTURY_START_YEAR,)
+        else:
+            query, params = _TEAM_QUERY_ALL, ()
         
-        cursor.execute(query)
+        cursor.execute(query, params)
         teams = [dict(row) for row in cursor.fetchall()]
         
-        conn.close()
-        
         return jsonify(teams)
     
     except Exception as e:
         print(f"Error in api_team_rankings: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Resolve optional tables once; the schema does not change while the app runs
+# (restart the app after the first ELO calculation creates its tables). The
+# app never writes to the database: tables, indexes and WAL mode are set up by
+# import_data.py and the ELO scripts.
+_TABLES = get_table_names()
+HAS_DRIVER_ELO = 'driver_elo' in _TABLES
+HAS_ELO_HISTORY = 'driver_elo_history' in _TABLES
+HAS_DRIVER_STATS = 'driver_stats' in _TABLES
+RACE_TABLE = _TABLES.get('race') or _TABLES.get('races')
+
+if get_journal_mode() != 'wal':
+    print("Warning: database is not in WAL mode - requests can block while it is "
+          "written. Run import_data.py or an ELO calculation to convert it.")
+if not HAS_DRIVER_STATS:
+    print("Warning: Driver_Stats table not found - career stats are aggregated "
+          "from Result on each request until the ELO calculation is run.")
+_RANKINGS_QUERIES = build_rankings_queries('Driver_Stats' if HAS_DRIVER_STATS else _LIVE_DRIVER_STATS)
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server; use wsgi.py with gunicorn in production
+    app.run(debug=DEBUG, host=HOST, port=PORT)
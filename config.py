@@ -3,6 +3,8 @@ Configuration file for F1 ELO Web Application
 Modify these settings to customize the app
 """
 
+import sqlite3
+
 # Flask Configuration
 DEBUG = True
 HOST = '0.0.0.0'
@@ -10,6 +12,26 @@ PORT = 5000
 
 # Database Configuration
 DB_PATH = 'DB/f1_database.db'
+DB_CACHE_SIZE_KB = 65536  # 64 MB page cache per connection
+DB_MMAP_SIZE = 268435456  # 256 MB memory-mapped reads
+
+def open_db(path=DB_PATH, readonly=True):
+    """
+    Open the database with the standard connection settings.
+    Read-only connections use a mode=ro URI so they never take write locks;
+    writable ones switch the file to WAL so readers are not blocked.
+    """
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        conn.execute("PRAGMA query_only=1")
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB:d}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE:d}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
 
 # Application Settings
 APP_TITLE = "F1 ELO Rankings"
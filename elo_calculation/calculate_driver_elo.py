@@ -16,11 +16,74 @@ Based on the comprehensive framework from:
 "A Comprehensive Framework for a Robust Formula 1 Driver Elo Rating System"
 """
 
+import math
+import re
 import sqlite3
 import pandas as pd
 import numpy as np
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from collections import defaultdict
+from itertools import combinations, groupby
+from operator import itemgetter
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    # numba is optional: without it ratings are updated with numpy batches
+    HAVE_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# 10 ** (x / 400) == exp(x * ln(10) / 400): one exp instead of a pow per matchup
+LN10_OVER_400 = math.log(10) / 400
+
+
+@njit(nogil=True)
+def apply_matchups_sequential(elo, races, elite, winners, losers, k_rookie, k_established,
+                              k_elite, rookie_races, elite_threshold):
+    """
+    Apply head-to-heads one after another with the scalar Elo update, so
+    each matchup sees the previous one's result. Compiled by numba.
+    """
+    for m in range(len(winners)):
+        winner = winners[m]
+        loser = losers[m]
+        winner_elo = elo[winner]
+        loser_elo = elo[loser]
+        
+        winner_expected = 1 / (1 + math.exp((loser_elo - winner_elo) * LN10_OVER_400))
+        loser_expected = 1 - winner_expected
+        
+        if elite[winner]:
+            winner_k = k_elite
+        elif races[winner] < rookie_races:
+            winner_k = k_rookie
+        else:
+            winner_k = k_established
+        if elite[loser]:
+            loser_k = k_elite
+        elif races[loser] < rookie_races:
+            loser_k = k_rookie
+        else:
+            loser_k = k_established
+        
+        new_winner_elo = winner_elo + winner_k * (1 - winner_expected)
+        new_loser_elo = loser_elo + loser_k * (0 - loser_expected)
+        elo[winner] = new_winner_elo
+        elo[loser] = new_loser_elo
+        
+        races[winner] += 1
+        races[loser] += 1
+        
+        if new_winner_elo >= elite_threshold:
+            elite[winner] = True
+        if new_loser_elo >= elite_threshold:
+            elite[loser] = True
 
 
 class TeammateBasedF1Elo:
@@ -34,6 +97,15 @@ class TeammateBasedF1Elo:
     def __init__(self, db_path='DB/f1_database.db'):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
+        # WAL lets the web app keep reading while ratings are rewritten, and
+        # NORMAL sync is safe in WAL mode (no fsync on every commit)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # The whole Race/Result history is read in bulk: a 64 MB page cache
+        # and memory-mapped reads keep it off the pread path
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
         
         # Initial rating for all new drivers
         self.INITIAL_RATING = 1500
@@ -51,28 +123,39 @@ class TeammateBasedF1Elo:
         self.QUALIFYING_WEIGHT = 0.3
         self.RACE_WEIGHT = 0.7
         
-        # Driver rating storage
-        # Structure: {driver_id: {
-        #   'qualifying_elo': float,
-        #   'race_elo': float,
-        #   'qualifying_races': int,
-        #   'race_races': int,
-        #   'ever_elite_qualifying': bool,
-        #   'ever_elite_race': bool
-        # }}
-        self.driver_ratings = defaultdict(lambda: {
-            'qualifying_elo': self.INITIAL_RATING,
-            'race_elo': self.INITIAL_RATING,
-            'qualifying_races': 0,
-            'race_races': 0,
-            'ever_elite_qualifying': False,
-            'ever_elite_race': False
-        })
+        # Era difficulty multipliers (based on field strength research):
+        # debuts before each boundary year get the multiplier at that position
+        self.ERA_BOUNDARIES = (1960, 1970, 1980, 2000)
+        self.ERA_MULTIPLIERS = (
+            0.92,  # Early era: smaller fields, less depth
+            0.95,  # 1960s: growing competition
+            0.97,  # 1970s: professional era begins
+            0.99,  # Modern era: high competition
+            1.00,  # Contemporary: peak competition
+        )
+        
+        # Driver rating storage (Structure of Arrays): each rated driver gets
+        # a dense index into parallel arrays, assigned in the order of their
+        # first counted matchup
+        # Structure: {driver_id: index}
+        self.driver_index = {}
+        self.qualifying_elo = np.empty(0, dtype=np.float64)
+        self.race_elo = np.empty(0, dtype=np.float64)
+        self.qualifying_races = np.empty(0, dtype=np.int64)
+        self.race_races = np.empty(0, dtype=np.int64)
+        self.ever_elite_qualifying = np.empty(0, dtype=bool)
+        self.ever_elite_race = np.empty(0, dtype=bool)
         
         # Season-by-season ELO snapshots
         # Structure: {(driver_id, season_year): {'qualifying_elo': float, 'race_elo': float, 'global_elo': float}}
         self.season_snapshots = {}
         
+        # Drivers with at least one result in the season being processed
+        self.season_participants = set()
+        
+        # Runs the race-session rating updates next to qualifying
+        self.session_executor = ThreadPoolExecutor(max_workers=1)
+        
         # Mechanical failure status codes (DNFs that should be EXCLUDED)
         self.MECHANICAL_FAILURES = {
             'Engine', 'Gearbox', 'Transmission', 'Clutch', 'Hydraulics',
@@ -91,6 +174,19 @@ class TeammateBasedF1Elo:
             'Fatal accident', 'Injury', 'Driver Seat', 'Seat'
         }
         
+        # Each keyword set compiled into one alternation, so a status string
+        # is scanned once instead of once per keyword
+        self.mechanical_pattern = self.keyword_pattern(self.MECHANICAL_FAILURES)
+        self.driver_error_pattern = self.keyword_pattern(self.DRIVER_ERRORS)
+        
+        # Classification of each distinct status string seen so far
+        # Structure: {status: (mechanical_dnf, driver_error_dnf, finished)}
+        self.status_flags = {}
+        
+        # Reliability score per total matchup count (many drivers share a count)
+        # Structure: {total_matchups: reliability_score}
+        self.reliability_scores = {}
+        
     def get_k_factor(self, current_elo, races_completed, ever_elite):
         """
         Dynamic K-factor based on driver experience and rating.
@@ -98,13 +194,11 @@ class TeammateBasedF1Elo:
         Tier 1 (Rookie): K=40 for first 30 races
         Tier 2 (Established): K=20 for >30 races if rating < 1750
         Tier 3 (Elite): K=10 if rating ever exceeded 1750
+        
+        Works element-wise on arrays of drivers.
         """
-        if ever_elite:
-            return self.K_ELITE
-        elif races_completed < self.ROOKIE_RACES:
-            return self.K_ROOKIE
-        else:
-            return self.K_ESTABLISHED
+        return np.where(ever_elite, self.K_ELITE,
+                        np.where(races_completed < self.ROOKIE_RACES, self.K_ROOKIE, self.K_ESTABLISHED))
     
     def expected_score(self, rating_a, rating_b):
         """
@@ -112,7 +206,7 @@ class TeammateBasedF1Elo:
         
         E_A = 1 / (1 + 10^((R_B - R_A) / 400))
         """
-        return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+        return 1 / (1 + np.exp((rating_b - rating_a) * LN10_OVER_400))
     
     def update_rating(self, rating, k_factor, actual_score, expected_score):
         """
@@ -122,31 +216,27 @@ class TeammateBasedF1Elo:
         """
         return rating + k_factor * (actual_score - expected_score)
     
+    @staticmethod
+    def keyword_pattern(keywords):
+        """Case-insensitive regex matching any of the keywords as a substring."""
+        return re.compile('|'.join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+    
     def is_mechanical_dnf(self, status):
         """Check if DNF reason is mechanical (should exclude matchup)."""
         if pd.isna(status) or status == '':
             return False
         
-        status_upper = str(status).upper()
-        
-        # Check for mechanical failure keywords
-        for failure in self.MECHANICAL_FAILURES:
-            if failure.upper() in status_upper:
-                return True
-        return False
+        # Check for mechanical failure keywords (case-insensitive, so the
+        # status is never upper-cased)
+        return self.mechanical_pattern.search(str(status)) is not None
     
     def is_driver_error_dnf(self, status):
         """Check if DNF reason is driver error (should count as loss)."""
         if pd.isna(status) or status == '':
             return False
         
-        status_upper = str(status).upper()
-        
         # Check for driver error keywords
-        for error in self.DRIVER_ERRORS:
-            if error.upper() in status_upper:
-                return True
-        return False
+        return self.driver_error_pattern.search(str(status)) is not None
     
     def is_finished(self, status):
         """Check if driver finished the race (classified)."""
@@ -154,169 +244,194 @@ class TeammateBasedF1Elo:
             return False
         return str(status).strip() == 'Finished' or str(status).startswith('+')
     
-    def process_qualifying_matchup(self, driver1_id, driver2_id, driver1_pos, driver2_pos,
-                                   driver1_status, driver2_status):
+    def classify_status(self, status):
         """
-        Process a qualifying head-to-head between teammates.
+        Classify a result status once for all matchups it takes part in.
+        There are only a few hundred distinct statuses, so the keyword scans
+        run once per status string and later calls are a dict lookup.
         
-        Returns: True if matchup was processed, False if excluded
+        Returns: (mechanical_dnf, driver_error_dnf, finished) flags
+        """
+        flags = self.status_flags.get(status)
+        if flags is None:
+            flags = (self.is_mechanical_dnf(status),
+                     self.is_driver_error_dnf(status),
+                     self.is_finished(status))
+            self.status_flags[status] = flags
+        return flags
+    
+    def get_driver_index(self, driver_id):
+        """
+        Dense rating-array index for a driver, assigned (with initial
+        ratings) on the driver's first counted matchup.
+        """
+        idx = self.driver_index.get(driver_id)
+        if idx is None:
+            idx = len(self.driver_index)
+            self.driver_index[driver_id] = idx
+            if idx == len(self.qualifying_elo):
+                self.grow_ratings(max(64, 2 * idx))
+        return idx
+    
+    def grow_ratings(self, capacity):
+        """Resize the rating arrays to hold `capacity` drivers."""
+        extra = capacity - len(self.qualifying_elo)
+        self.qualifying_elo = np.concatenate([self.qualifying_elo, np.full(extra, float(self.INITIAL_RATING))])
+        self.race_elo = np.concatenate([self.race_elo, np.full(extra, float(self.INITIAL_RATING))])
+        self.qualifying_races = np.concatenate([self.qualifying_races, np.zeros(extra, dtype=np.int64)])
+        self.race_races = np.concatenate([self.race_races, np.zeros(extra, dtype=np.int64)])
+        self.ever_elite_qualifying = np.concatenate([self.ever_elite_qualifying, np.zeros(extra, dtype=bool)])
+        self.ever_elite_race = np.concatenate([self.ever_elite_race, np.zeros(extra, dtype=bool)])
+    
+    def qualifying_winner(self, driver1_id, driver2_id, driver1_pos, driver2_pos,
+                          driver1_status, driver2_status):
+        """
+        Decide a qualifying head-to-head between teammates.
+        
+        Statuses are the flag tuples returned by classify_status().
+        Returns: (winner_id, loser_id), or None if the matchup is excluded
         """
         # Exclude if either driver had mechanical issues
-        if self.is_mechanical_dnf(driver1_status) or self.is_mechanical_dnf(driver2_status):
-            return False
+        if driver1_status[0] or driver2_status[0]:
+            return None
         
         # Determine winner (lower position is better)
         if driver1_pos < driver2_pos:
-            winner_id, loser_id = driver1_id, driver2_id
-        else:
-            winner_id, loser_id = driver2_id, driver1_id
-        
-        # Get current ratings
-        winner_elo = self.driver_ratings[winner_id]['qualifying_elo']
-        loser_elo = self.driver_ratings[loser_id]['qualifying_elo']
-        
-        # Calculate expected scores
-        winner_expected = self.expected_score(winner_elo, loser_elo)
-        loser_expected = 1 - winner_expected
-        
-        # Get K-factors
-        winner_k = self.get_k_factor(
-            winner_elo,
-            self.driver_ratings[winner_id]['qualifying_races'],
-            self.driver_ratings[winner_id]['ever_elite_qualifying']
-        )
-        loser_k = self.get_k_factor(
-            loser_elo,
-            self.driver_ratings[loser_id]['qualifying_races'],
-            self.driver_ratings[loser_id]['ever_elite_qualifying']
-        )
-        
-        # Update ratings (winner gets 1, loser gets 0)
-        new_winner_elo = self.update_rating(winner_elo, winner_k, 1, winner_expected)
-        new_loser_elo = self.update_rating(loser_elo, loser_k, 0, loser_expected)
-        
-        # Store updated ratings
-        self.driver_ratings[winner_id]['qualifying_elo'] = new_winner_elo
-        self.driver_ratings[loser_id]['qualifying_elo'] = new_loser_elo
-        
-        # Increment race counters
-        self.driver_ratings[winner_id]['qualifying_races'] += 1
-        self.driver_ratings[loser_id]['qualifying_races'] += 1
-        
-        # Check for elite status
-        if new_winner_elo >= self.ELITE_THRESHOLD:
-            self.driver_ratings[winner_id]['ever_elite_qualifying'] = True
-        if new_loser_elo >= self.ELITE_THRESHOLD:
-            self.driver_ratings[loser_id]['ever_elite_qualifying'] = True
-        
-        return True
+            return driver1_id, driver2_id
+        return driver2_id, driver1_id
     
-    def process_race_matchup(self, driver1_id, driver2_id, driver1_pos, driver2_pos,
-                            driver1_status, driver2_status):
+    def race_winner(self, driver1_id, driver2_id, driver1_pos, driver2_pos,
+                    driver1_status, driver2_status):
         """
-        Process a race head-to-head between teammates.
+        Decide a race head-to-head between teammates.
         
-        Returns: True if matchup was processed, False if excluded
+        Statuses are the flag tuples returned by classify_status().
+        Returns: (winner_id, loser_id), or None if the matchup is excluded
         """
-        # Check if either driver had mechanical DNF (exclude matchup)
-        d1_mechanical = self.is_mechanical_dnf(driver1_status)
-        d2_mechanical = self.is_mechanical_dnf(driver2_status)
+        d1_mechanical, d1_error, d1_finished = driver1_status
+        d2_mechanical, d2_error, d2_finished = driver2_status
         
+        # Check if either driver had mechanical DNF (exclude matchup)
         if d1_mechanical or d2_mechanical:
-            return False
-        
-        # Check if drivers had driver error DNF (counts as loss)
-        d1_error = self.is_driver_error_dnf(driver1_status)
-        d2_error = self.is_driver_error_dnf(driver2_status)
-        d1_finished = self.is_finished(driver1_status)
-        d2_finished = self.is_finished(driver2_status)
+            return None
         
         # If both DNF'd due to driver error, exclude (no clean winner)
         if d1_error and d2_error:
-            return False
+            return None
         
         # Determine winner
         # Driver error DNF automatically loses if opponent finished or had no error
         if d1_error and (d2_finished or not d2_error):
-            winner_id, loser_id = driver2_id, driver1_id
+            return driver2_id, driver1_id
         elif d2_error and (d1_finished or not d1_error):
-            winner_id, loser_id = driver1_id, driver2_id
-        else:
-            # Normal comparison by position (lower is better)
-            if driver1_pos < driver2_pos:
-                winner_id, loser_id = driver1_id, driver2_id
+            return driver1_id, driver2_id
+        
+        # Normal comparison by position (lower is better)
+        if driver1_pos < driver2_pos:
+            return driver1_id, driver2_id
+        return driver2_id, driver1_id
+    
+    def apply_season_matchups(self, quali_winners, quali_losers, race_winners, race_losers):
+        """
+        Apply a season's qualifying and race head-to-heads. The two sessions
+        update separate rating arrays, so with numba (whose kernel releases
+        the GIL) the race stream runs in a worker thread alongside qualifying.
+        """
+        race_update = None
+        if race_winners:
+            args = (self.race_elo, self.race_races, self.ever_elite_race, race_winners, race_losers)
+            if HAVE_NUMBA and quali_winners:
+                race_update = self.session_executor.submit(self.apply_matchups, *args)
             else:
-                winner_id, loser_id = driver2_id, driver1_id
+                self.apply_matchups(*args)
+        if quali_winners:
+            self.apply_matchups(self.qualifying_elo, self.qualifying_races,
+                                self.ever_elite_qualifying, quali_winners, quali_losers)
+        if race_update is not None:
+            race_update.result()
+    
+    def apply_matchups(self, elo, races, elite, winners, losers):
+        """
+        Apply head-to-heads of one session type (qualifying or race), in
+        order, to that session's rating arrays.
+        
+        winners/losers are dense driver indexes. Matchups with no driver in
+        common are independent and are updated as one vectorised step; a
+        driver appears in several matchups (one per race, or more with three
+        or more cars in a team), so those are split into consecutive batches
+        and applied in order (each one sees the previous one's result). With
+        numba installed the compiled sequential kernel handles them instead.
+        """
+        if HAVE_NUMBA:
+            apply_matchups_sequential(
+                elo, races, elite,
+                np.array(winners, dtype=np.intp), np.array(losers, dtype=np.intp),
+                self.K_ROOKIE, self.K_ESTABLISHED, self.K_ELITE,
+                self.ROOKIE_RACES, self.ELITE_THRESHOLD
+            )
+            return
+        
+        if len(set(winners) | set(losers)) < 2 * len(winners):
+            start = 0
+            seen = set()
+            for i, (winner, loser) in enumerate(zip(winners, losers)):
+                if winner in seen or loser in seen:
+                    self.apply_matchups(elo, races, elite, winners[start:i], losers[start:i])
+                    start = i
+                    seen = set()
+                seen.update((winner, loser))
+            self.apply_matchups(elo, races, elite, winners[start:], losers[start:])
+            return
         
-        # Get current ratings
-        winner_elo = self.driver_ratings[winner_id]['race_elo']
-        loser_elo = self.driver_ratings[loser_id]['race_elo']
+        winners = np.array(winners, dtype=np.intp)
+        losers = np.array(losers, dtype=np.intp)
+        winner_elo = elo[winners]
+        loser_elo = elo[losers]
         
         # Calculate expected scores
         winner_expected = self.expected_score(winner_elo, loser_elo)
         loser_expected = 1 - winner_expected
         
         # Get K-factors
-        winner_k = self.get_k_factor(
-            winner_elo,
-            self.driver_ratings[winner_id]['race_races'],
-            self.driver_ratings[winner_id]['ever_elite_race']
-        )
-        loser_k = self.get_k_factor(
-            loser_elo,
-            self.driver_ratings[loser_id]['race_races'],
-            self.driver_ratings[loser_id]['ever_elite_race']
-        )
+        winner_k = self.get_k_factor(winner_elo, races[winners], elite[winners])
+        loser_k = self.get_k_factor(loser_elo, races[losers], elite[losers])
         
-        # Update ratings
+        # Update ratings (winner gets 1, loser gets 0)
         new_winner_elo = self.update_rating(winner_elo, winner_k, 1, winner_expected)
         new_loser_elo = self.update_rating(loser_elo, loser_k, 0, loser_expected)
-        
-        # Store updated ratings
-        self.driver_ratings[winner_id]['race_elo'] = new_winner_elo
-        self.driver_ratings[loser_id]['race_elo'] = new_loser_elo
+        elo[winners] = new_winner_elo
+        elo[losers] = new_loser_elo
         
         # Increment race counters
-        self.driver_ratings[winner_id]['race_races'] += 1
-        self.driver_ratings[loser_id]['race_races'] += 1
+        races[winners] += 1
+        races[losers] += 1
         
         # Check for elite status
-        if new_winner_elo >= self.ELITE_THRESHOLD:
-            self.driver_ratings[winner_id]['ever_elite_race'] = True
-        if new_loser_elo >= self.ELITE_THRESHOLD:
-            self.driver_ratings[loser_id]['ever_elite_race'] = True
-        
-        return True
+        elite[winners] |= new_winner_elo >= self.ELITE_THRESHOLD
+        elite[losers] |= new_loser_elo >= self.ELITE_THRESHOLD
     
     def normalize_ratings(self, season_year):
         """
         Normalize all ratings to mean of 1500 at end of season.
         Prevents rating inflation across eras.
         """
-        if not self.driver_ratings:
+        n = len(self.driver_index)
+        if n == 0:
             return
         
-        # Calculate mean qualifying Elo
-        qualifying_elos = [r['qualifying_elo'] for r in self.driver_ratings.values()]
-        mean_qualifying = np.mean(qualifying_elos)
+        # Views of the rated drivers, shifted in place below
+        qualifying_elo = self.qualifying_elo[:n]
+        race_elo = self.race_elo[:n]
         
-        # Calculate mean race Elo
-        race_elos = [r['race_elo'] for r in self.driver_ratings.values()]
-        mean_race = np.mean(race_elos)
+        # Calculate mean qualifying and race Elo
+        mean_qualifying = qualifying_elo.mean()
+        mean_race = race_elo.mean()
         
-        # Normalize all ratings
-        for driver_id in self.driver_ratings:
-            # Qualifying normalization
-            self.driver_ratings[driver_id]['qualifying_elo'] = (
-                self.driver_ratings[driver_id]['qualifying_elo'] - 
-                mean_qualifying + self.INITIAL_RATING
-            )
-            
-            # Race normalization
-            self.driver_ratings[driver_id]['race_elo'] = (
-                self.driver_ratings[driver_id]['race_elo'] - 
-                mean_race + self.INITIAL_RATING
-            )
+        # Normalize all ratings (no temporary arrays)
+        qualifying_elo -= mean_qualifying
+        qualifying_elo += self.INITIAL_RATING
+        race_elo -= mean_race
+        race_elo += self.INITIAL_RATING
         
         print(f"  Season {season_year} normalized: Quali mean {mean_qualifying:.1f}→1500, "
               f"Race mean {mean_race:.1f}→1500")
@@ -325,19 +440,28 @@ class TeammateBasedF1Elo:
         """
         Save ELO ratings snapshot at the end of a season.
         This allows us to retrieve historical ratings for any given year.
+        
+        Only drivers who raced that season are saved - retired drivers'
+        ratings would otherwise be re-written every year (the yearly
+        rankings only ever show that season's drivers).
         """
-        for driver_id, ratings in self.driver_ratings.items():
-            # Only save if driver participated that season
-            if ratings['qualifying_races'] > 0 or ratings['race_races'] > 0:
-                qualifying_elo = ratings['qualifying_elo']
-                race_elo = ratings['race_elo']
-                global_elo = self.calculate_global_elo(qualifying_elo, race_elo)
-                
-                self.season_snapshots[(driver_id, season_year)] = {
-                    'qualifying_elo': qualifying_elo,
-                    'race_elo': race_elo,
-                    'global_elo': global_elo
-                }
+        for driver_id in self.season_participants:
+            # Drivers without any counted teammate matchup have no ratings
+            idx = self.driver_index.get(driver_id)
+            if idx is None:
+                continue
+            
+            qualifying_elo = float(self.qualifying_elo[idx])
+            race_elo = float(self.race_elo[idx])
+            global_elo = self.calculate_global_elo(qualifying_elo, race_elo)
+            
+            self.season_snapshots[(driver_id, season_year)] = {
+                'qualifying_elo': qualifying_elo,
+                'race_elo': race_elo,
+                'global_elo': global_elo
+            }
+        
+        self.season_participants = set()
     
     def calculate_global_elo(self, qualifying_elo, race_elo):
         """
@@ -358,10 +482,12 @@ class TeammateBasedF1Elo:
         - 20 matchups = ~63% reliability
         - 10 matchups = ~45% reliability
         """
-        # Sigmoid function: reliability = 100 / (1 + e^(-(matchups - 30)/20))
-        import math
-        reliability = 100 / (1 + math.exp(-(matchups - 30) / 20))
-        return round(reliability, 1)
+        reliability = self.reliability_scores.get(matchups)
+        if reliability is None:
+            # Sigmoid function: reliability = 100 / (1 + e^(-(matchups - 30)/20))
+            reliability = round(100 / (1 + math.exp(-(matchups - 30) / 20)), 1)
+            self.reliability_scores[matchups] = reliability
+        return reliability
     
     def calculate_era_adjustment(self, debut_year, total_matchups):
         """
@@ -372,17 +498,9 @@ class TeammateBasedF1Elo:
         
         Adjustment reduces Elo for drivers with limited competition.
         """
-        # Era difficulty multipliers (based on field strength research)
-        if debut_year < 1960:
-            era_multiplier = 0.92  # Early era: smaller fields, less depth
-        elif debut_year < 1970:
-            era_multiplier = 0.95  # 1960s: growing competition
-        elif debut_year < 1980:
-            era_multiplier = 0.97  # 1970s: professional era begins
-        elif debut_year < 2000:
-            era_multiplier = 0.99  # Modern era: high competition
-        else:
-            era_multiplier = 1.00  # Contemporary: peak competition
+        # Era difficulty multiplier for the debut year's era (a NaN debut
+        # year compares false everywhere and falls in the last era)
+        era_multiplier = self.ERA_MULTIPLIERS[bisect_right(self.ERA_BOUNDARIES, debut_year)]
         
         # Sample size penalty for very few matchups
         if total_matchups < 30:
@@ -406,97 +524,126 @@ class TeammateBasedF1Elo:
               f"{self.RACE_WEIGHT*100:.0f}% Race")
         print("="*70)
         
+        # Size the rating arrays for every driver up front so they are never
+        # resized mid-run. Indices are still handed out on a driver's first
+        # matchup: normalization averages only drivers who have been rated.
+        driver_count = self.conn.execute("SELECT COUNT(*) FROM Driver").fetchone()[0]
+        if driver_count > len(self.qualifying_elo):
+            self.grow_ratings(driver_count)
+        
         # Get all races ordered chronologically
         query = """
             SELECT r.race_id, r.season_year, r.round_number, r.race_name, r.race_date
             FROM Race r
             ORDER BY r.race_date, r.round_number
         """
-        races = pd.read_sql_query(query, self.conn)
+        races = self.conn.execute(query).fetchall()
+        
+        # Results are read in (race, team, driver) order: walking this index
+        # skips sorting the whole Result table
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_result_race_team ON Result(race_id, team_id, driver_id)")
+        
+        # Fetch every result with team information in one query and split it
+        # by race, instead of a query round-trip per race. Rows stay plain
+        # tuples: (team_id, driver_id, grid_position, position, status flags).
+        # Sorting by (team, driver) within each race keeps teammates adjacent
+        # and ordered by driver_id to ensure consistent pairing
+        results_query = """
+            SELECT 
+                res.race_id,
+                res.team_id,
+                res.driver_id,
+                res.grid_position,
+                res.position,
+                res.status
+            FROM Result res
+            JOIN Driver d ON res.driver_id = d.driver_id
+            ORDER BY res.race_id, res.team_id, res.driver_id
+        """
+        results_by_race = {}
+        for race_id, team_id, driver_id, grid, position, status in self.conn.execute(results_query):
+            # Classify each driver's status once, not once per matchup
+            results_by_race.setdefault(race_id, []).append(
+                (team_id, driver_id, grid, position, self.classify_status(status))
+            )
         
         current_season = None
         total_quali_matchups = 0
         total_race_matchups = 0
         
-        for idx, race in races.iterrows():
-            race_id = race['race_id']
-            year = race['season_year']
-            
+        # Matchup outcomes depend only on results, never on ratings, so a
+        # season's head-to-heads are collected (as dense driver indexes, in
+        # race order) and applied in one go before it is normalized
+        quali_winners, quali_losers = [], []
+        race_winners, race_losers = [], []
+        
+        # Per-pair methods bound once, not looked up for every pair
+        qualifying_winner = self.qualifying_winner
+        race_winner = self.race_winner
+        get_driver_index = self.get_driver_index
+        
+        for idx, (race_id, year, *_) in enumerate(races):
             # Season normalization at year end
             if current_season is not None and year != current_season:
+                self.apply_season_matchups(quali_winners, quali_losers, race_winners, race_losers)
+                total_quali_matchups += len(quali_winners)
+                total_race_matchups += len(race_winners)
+                quali_winners, quali_losers = [], []
+                race_winners, race_losers = [], []
+                
                 self.normalize_ratings(current_season)
                 # Save season snapshot after normalization
                 self.save_season_snapshot(current_season)
             current_season = year
             
-            # Get all results for this race with team information
-            results_query = """
-                SELECT 
-                    res.result_id,
-                    res.driver_id,
-                    res.team_id,
-                    res.grid_position,
-                    res.position,
-                    res.status,
-                    d.first_name,
-                    d.last_name
-                FROM Result res
-                JOIN Driver d ON res.driver_id = d.driver_id
-                WHERE res.race_id = ?
-                ORDER BY res.team_id, res.position
-            """
-            results = pd.read_sql_query(results_query, self.conn, params=(race_id,))
+            results = results_by_race.get(race_id)
             
-            if results.empty:
+            if results is None:
                 continue
             
-            # Group by team to find teammate pairs
-            teams = results.groupby('team_id')
-            
-            quali_matchups = 0
-            race_matchups = 0
+            self.season_participants.update(row[1] for row in results)
             
-            for team_id, team_results in teams:
-                if len(team_results) < 2:
-                    continue  # Need at least 2 drivers
-                
-                # Sort by driver_id to ensure consistent pairing
-                team_results = team_results.sort_values('driver_id')
-                drivers = team_results.to_dict('records')
-                
-                # Process all pairwise combinations (usually just 2 drivers)
-                for i in range(len(drivers)):
-                    for j in range(i + 1, len(drivers)):
-                        d1, d2 = drivers[i], drivers[j]
-                        
-                        # Process qualifying matchup
-                        if pd.notna(d1['grid_position']) and pd.notna(d2['grid_position']):
-                            if self.process_qualifying_matchup(
-                                d1['driver_id'], d2['driver_id'],
-                                d1['grid_position'], d2['grid_position'],
-                                d1['status'], d2['status']
-                            ):
-                                quali_matchups += 1
-                        
-                        # Process race matchup
-                        if pd.notna(d1['position']) and pd.notna(d2['position']):
-                            if self.process_race_matchup(
-                                d1['driver_id'], d2['driver_id'],
-                                d1['position'], d2['position'],
-                                d1['status'], d2['status']
-                            ):
-                                race_matchups += 1
-            
-            total_quali_matchups += quali_matchups
-            total_race_matchups += race_matchups
+            # Group by team to find teammate pairs: rows arrive sorted, so
+            # each team is one contiguous run
+            for _, team_rows in groupby(results, key=itemgetter(0)):
+                # Process all pairwise combinations; almost every team has
+                # exactly 2 drivers, which is a single pair as-is
+                team_rows = tuple(team_rows)
+                pairs = (team_rows,) if len(team_rows) == 2 else combinations(team_rows, 2)
+                for row1, row2 in pairs:
+                    _, driver1_id, grid1, position1, status1 = row1
+                    _, driver2_id, grid2, position2, status2 = row2
+                    
+                    # Qualifying matchup
+                    if grid1 is not None and grid2 is not None:
+                        outcome = qualifying_winner(
+                            driver1_id, driver2_id, grid1, grid2, status1, status2
+                        )
+                        if outcome is not None:
+                            quali_winners.append(get_driver_index(outcome[0]))
+                            quali_losers.append(get_driver_index(outcome[1]))
+                    
+                    # Race matchup
+                    if position1 is not None and position2 is not None:
+                        outcome = race_winner(
+                            driver1_id, driver2_id, position1, position2, status1, status2
+                        )
+                        if outcome is not None:
+                            race_winners.append(get_driver_index(outcome[0]))
+                            race_losers.append(get_driver_index(outcome[1]))
             
             # Progress update every 50 races
             if (idx + 1) % 50 == 0:
                 print(f"Processed {idx + 1}/{len(races)} races... "
-                      f"(Quali: {total_quali_matchups}, Race: {total_race_matchups} matchups)")
+                      f"(Quali: {total_quali_matchups + len(quali_winners)}, "
+                      f"Race: {total_race_matchups + len(race_winners)} matchups)")
         
         # Final season normalization
         if current_season is not None:
+            self.apply_season_matchups(quali_winners, quali_losers, race_winners, race_losers)
+            total_quali_matchups += len(quali_winners)
+            total_race_matchups += len(race_winners)
+            
             self.normalize_ratings(current_season)
             # Save final season snapshot
             self.save_season_snapshot(current_season)
@@ -506,7 +653,7 @@ class TeammateBasedF1Elo:
         print(f"Total Races Processed: {len(races)}")
         print(f"Total Qualifying Matchups: {total_quali_matchups}")
         print(f"Total Race Matchups: {total_race_matchups}")
-        print(f"Drivers Rated: {len(self.driver_ratings)}")
+        print(f"Drivers Rated: {len(self.driver_index)}")
         print(f"Season Snapshots Saved: {len(self.season_snapshots)}")
         print("="*70)
     
@@ -516,6 +663,11 @@ class TeammateBasedF1Elo:
         """
         print("\nSaving ratings to database...")
         
+        # Ratings and season snapshots are rewritten in one transaction:
+        # readers see either the old or the new set, and the log is
+        # synced once
+        self.conn.execute("BEGIN IMMEDIATE")
+        
         # Clear existing ratings
         self.conn.execute("DELETE FROM Driver_Elo")
         
@@ -525,20 +677,22 @@ class TeammateBasedF1Elo:
             FROM Driver d
         """
         drivers_df = pd.read_sql_query(driver_query, self.conn)
-        driver_info = {row['driver_id']: {
-            'name': f"{row['first_name']} {row['last_name']}",
-            'debut_year': row['debut_year']
-        } for _, row in drivers_df.iterrows()}
+        driver_info = {driver_id: {
+            'name': f"{first_name} {last_name}",
+            'debut_year': debut_year
+        } for driver_id, first_name, last_name, debut_year in drivers_df.itertuples(index=False, name=None)}
         
         # Prepare data for insertion
         elo_records = []
-        for driver_id, ratings in self.driver_ratings.items():
-            qualifying_elo = ratings['qualifying_elo']
-            race_elo = ratings['race_elo']
+        for driver_id, idx in self.driver_index.items():
+            qualifying_elo = float(self.qualifying_elo[idx])
+            race_elo = float(self.race_elo[idx])
+            qualifying_races = int(self.qualifying_races[idx])
+            race_races = int(self.race_races[idx])
             global_elo = self.calculate_global_elo(qualifying_elo, race_elo)
             
             # Calculate additional metrics
-            total_matchups = ratings['qualifying_races'] + ratings['race_races']
+            total_matchups = qualifying_races + race_races
             reliability_score = self.calculate_reliability_score(total_matchups)
             
             # Get debut year
@@ -554,38 +708,70 @@ class TeammateBasedF1Elo:
                 'race_elo': round(race_elo, 2),
                 'global_elo': round(global_elo, 2),
                 'era_adjusted_elo': round(era_adjusted_elo, 2),
-                'qualifying_races': ratings['qualifying_races'],
-                'race_races': ratings['race_races'],
+                'qualifying_races': qualifying_races,
+                'race_races': race_races,
                 'total_matchups': total_matchups,
                 'reliability_score': reliability_score,
                 'debut_year': debut_year
             })
         
-        # Insert into database
-        elo_df = pd.DataFrame(elo_records)
-        elo_df.to_sql('Driver_Elo', self.conn, if_exists='replace', index=False)
+        # Insert into the existing (now empty) table with one prepared
+        # statement, keeping its schema instead of replacing it via pandas
+        if elo_records:
+            columns = list(elo_records[0])
+            self.conn.executemany(f"""
+                INSERT INTO Driver_Elo ({', '.join(columns)})
+                VALUES ({', '.join('?' * len(columns))})
+            """, [tuple(record.values()) for record in elo_records])
+        # The rankings join on driver_id
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_driver_elo_driver ON Driver_Elo(driver_id)")
         
-        self.conn.commit()
         print(f"✓ Saved {len(elo_records)} driver ratings to database")
         
         # Save season snapshots to a separate table
         print("\nSaving season-by-season ELO snapshots...")
-        snapshot_records = []
-        for (driver_id, season_year), snapshot in self.season_snapshots.items():
-            snapshot_records.append({
-                'driver_id': driver_id,
-                'season_year': season_year,
-                'qualifying_elo': round(snapshot['qualifying_elo'], 2),
-                'race_elo': round(snapshot['race_elo'], 2),
-                'global_elo': round(snapshot['global_elo'], 2)
-            })
+        snapshot_records = [
+            (
+                int(driver_id),
+                int(season_year),
+                round(snapshot['qualifying_elo'], 2),
+                round(snapshot['race_elo'], 2),
+                round(snapshot['global_elo'], 2)
+            )
+            for (driver_id, season_year), snapshot in self.season_snapshots.items()
+        ]
         
         if snapshot_records:
-            snapshot_df = pd.DataFrame(snapshot_records)
-            snapshot_df.to_sql('Driver_Elo_History', self.conn, if_exists='replace', index=False)
-            self.conn.commit()
+            # Recreate the table and bulk insert (no intermediate DataFrame;
+            # same columns as the to_sql version). The DROP/CREATE are part
+            # of the transaction too, so readers never see the table missing.
+            self.conn.execute("DROP TABLE IF EXISTS Driver_Elo_History")
+            self.conn.execute("""
+                CREATE TABLE Driver_Elo_History (
+                    driver_id INTEGER,
+                    season_year INTEGER,
+                    qualifying_elo REAL,
+                    race_elo REAL,
+                    global_elo REAL
+                )
+            """)
+            self.conn.executemany("""
+                INSERT INTO Driver_Elo_History
+                    (driver_id, season_year, qualifying_elo, race_elo, global_elo)
+                VALUES (?, ?, ?, ?, ?)
+            """, snapshot_records)
+            # Year rankings look snapshots up by season
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_driver_elo_history_season
+                ON Driver_Elo_History(season_year, driver_id)
+            """)
             print(f"✓ Saved {len(snapshot_records)} season snapshots to Driver_Elo_History table")
         
+        self.conn.commit()
+        
+        self.refresh_driver_stats()
+        self.create_indexes()
+        
         # Display top 20 by Global Elo (Raw)
         print("\n" + "="*80)
         print("TOP 20 DRIVERS BY GLOBAL ELO (Raw - Not Era Adjusted)")
@@ -629,8 +815,30 @@ class TeammateBasedF1Elo:
         print("  <50% = Low Confidence (<15 matchups)")
         print("="*80)
     
+    def refresh_driver_stats(self, script_path='Sql/refresh_driver_stats.sql'):
+        """
+        Rebuild the materialized Driver_Stats table (career races, wins,
+        podiums, latest team) that the web app joins for its rankings.
+        """
+        with open(script_path) as f:
+            self.conn.executescript(f.read())
+        
+        count = self.conn.execute("SELECT COUNT(*) FROM Driver_Stats").fetchone()[0]
+        print(f"✓ Refreshed Driver_Stats table ({count} drivers)")
+    
+    def create_indexes(self, script_path='Sql/create_indexes.sql'):
+        """
+        Create the indexes the web app's ranking queries use and refresh the
+        planner statistics. The app opens the database read-only, so this
+        step belongs to the pipeline.
+        """
+        with open(script_path) as f:
+            self.conn.executescript(f.read())
+        print("✓ Created ranking indexes and refreshed planner statistics")
+    
     def close(self):
         """Close database connection."""
+        self.session_executor.shutdown()
         self.conn.close()
 
 
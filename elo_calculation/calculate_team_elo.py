@@ -20,47 +20,146 @@ References:
 """
 
 import sqlite3
+import math
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
 
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    # numba is optional: without it ratings are updated with numpy per
+    # lineage, and the scalar kernels below run as plain Python
+    HAVE_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Raw performance score by finishing/grid position: P1 = 100, 5 points per
+# place, 0 from P21 on (index with min(position, 21))
+POSITION_SCORES = tuple(max(0, 100 - (position - 1) * 5) for position in range(22))
+POSITION_SCORE_ARRAY = np.array(POSITION_SCORES, dtype=np.float64)
+
+
+@njit
+def _volatility_f(x, delta, phi, v, a, tau):
+    """Glicko-2 step 5 objective f(x) for the new volatility"""
+    ex = math.exp(x)
+    num1 = ex * (delta**2 - phi**2 - v - ex)
+    denom1 = 2 * ((phi**2 + v + ex)**2)
+    num2 = x - a
+    denom2 = tau**2
+    return num1/denom1 - num2/denom2
 
-class Glicko2Rating:
-    """Glicko-2 rating with Rating (r), Rating Deviation (RD), and Volatility (σ)"""
-    def __init__(self, rating=1500, rd=350, volatility=0.06):
-        self.rating = rating
-        self.rd = rd
-        self.volatility = volatility
-        
-    def to_glicko_scale(self):
-        mu = (self.rating - 1500) / 173.7178
-        phi = self.rd / 173.7178
-        return mu, phi
+
+@njit
+def solve_volatility(delta, phi, v, sigma, tau, epsilon=0.000001, max_iterations=100):
+    """
+    Solve Glicko-2 step 5 for the new volatility with the Illinois
+    algorithm. Pure scalar math so numba can compile it when installed.
+    """
+    a = math.log(sigma**2)
+    
+    A = a
+    if delta**2 > phi**2 + v:
+        B = math.log(delta**2 - phi**2 - v)
+    else:
+        k = 1
+        while k < 100 and _volatility_f(a - k * tau, delta, phi, v, a, tau) < 0:
+            k += 1
+        B = a - k * tau
     
-    def from_glicko_scale(self, mu, phi):
-        self.rating = mu * 173.7178 + 1500
-        self.rd = phi * 173.7178
+    fA = _volatility_f(A, delta, phi, v, a, tau)
+    fB = _volatility_f(B, delta, phi, v, a, tau)
     
-    def conservative_rating(self):
-        return self.rating - 2 * self.rd
+    iteration = 0
+    while abs(B - A) > epsilon and iteration < max_iterations:
+        C = A + (A - B) * fA / (fB - fA)
+        fC = _volatility_f(C, delta, phi, v, a, tau)
+        if fC * fB < 0:
+            A = B
+            fA = fB
+        else:
+            fA = fA / 2
+        B = C
+        fB = fC
+        iteration += 1
+    
+    return math.exp(A / 2)
+
+
+@njit
+def update_session_ratings(rating, rd, volatility, indexes, performance, tau):
+    """
+    Glicko-2 update of every lineage in one session against all the others,
+    one lineage after another (each sees the ratings updated before it).
+    Same arithmetic as TeamEloCalculator.update_glicko2, compiled by numba
+    (libm exp and sequential sums, so results can differ from the numpy
+    path in the last bits).
+    """
+    count = len(indexes)
     
-    def __repr__(self):
-        return f"Rating(r={self.rating:.1f}, RD={self.rd:.1f}, σ={self.volatility:.4f})"
+    for i in range(count):
+        index = indexes[i]
+        mu = (rating[index] - 1500) / 173.7178
+        phi = rd[index] / 173.7178
+        
+        v_sum = 0.0
+        delta_sum = 0.0
+        for j in range(count):
+            if j == i:
+                continue
+            opponent = indexes[j]
+            mu_j = (rating[opponent] - 1500) / 173.7178
+            phi_j = rd[opponent] / 173.7178
+            g_phi_j = 1 / math.sqrt(1 + 3 * phi_j**2 / math.pi**2)
+            exponent = min(max(-g_phi_j * (mu - mu_j), -500.0), 500.0)
+            expected = 1 / (1 + math.exp(exponent))
+            
+            if performance[i] > performance[j]:
+                outcome = 1.0
+            elif performance[i] < performance[j]:
+                outcome = 0.0
+            else:
+                outcome = 0.5
+            
+            v_sum += g_phi_j**2 * expected * (1 - expected)
+            delta_sum += g_phi_j * (outcome - expected)
+        
+        v = 1 / v_sum if v_sum > 0 else 1e10
+        delta = v * delta_sum
+        
+        new_sigma = solve_volatility(delta, phi, v, volatility[index], tau)
+        new_sigma = min(max(new_sigma, 0.01), 0.5)
+        
+        phi_star = math.sqrt(phi**2 + new_sigma**2)
+        new_phi = 1 / math.sqrt(1/phi_star**2 + 1/v)
+        new_mu = mu + new_phi**2 * delta_sum
+        
+        rating[index] = min(max(new_mu * 173.7178 + 1500, 800.0), 2200.0)
+        rd[index] = min(max(new_phi * 173.7178, 30.0), 350.0)
+        volatility[index] = new_sigma
 
 
 class ConstructorLineage:
     """Maps team rebrands to persistent lineage IDs"""
-    LINEAGE_MAP = {
-        'jordan': 'jordan_lineage', 'midland': 'jordan_lineage', 'spyker': 'jordan_lineage',
-        'force_india': 'jordan_lineage', 'racing_point': 'jordan_lineage', 'aston_martin': 'jordan_lineage',
-        'stewart': 'redbull_lineage', 'jaguar': 'redbull_lineage', 'red_bull': 'redbull_lineage',
-        'sauber': 'sauber_lineage', 'bmw_sauber': 'sauber_lineage', 'alfa': 'sauber_lineage',
-        'toro_rosso': 'toro_rosso_lineage', 'alphatauri': 'toro_rosso_lineage', 'rb': 'toro_rosso_lineage',
-        'benetton': 'renault_lineage', 'renault': 'renault_lineage', 'lotus_f1': 'renault_lineage', 'alpine': 'renault_lineage',
-        'tyrrell': 'mercedes_lineage', 'bar': 'mercedes_lineage', 'honda': 'mercedes_lineage',
-        'brawn': 'mercedes_lineage', 'mercedes': 'mercedes_lineage',
-    }
+    # Canonical list: each constructor ref belongs to exactly one lineage
+    LINEAGES = (
+        ('jordan_lineage', ('jordan', 'midland', 'spyker', 'force_india', 'racing_point', 'aston_martin')),
+        ('redbull_lineage', ('stewart', 'jaguar', 'red_bull')),
+        ('sauber_lineage', ('sauber', 'bmw_sauber', 'alfa')),
+        ('toro_rosso_lineage', ('toro_rosso', 'alphatauri', 'rb')),
+        ('renault_lineage', ('benetton', 'renault', 'lotus_f1', 'alpine')),
+        ('mercedes_lineage', ('tyrrell', 'bar', 'honda', 'brawn', 'mercedes')),
+    )
+    LINEAGE_MAP = {ref: lineage_id for lineage_id, refs in LINEAGES for ref in refs}
+    assert len(LINEAGE_MAP) == sum(len(refs) for _, refs in LINEAGES), \
+        "constructor ref assigned to more than one lineage"
     
     @classmethod
     def get_lineage(cls, constructor_ref):
@@ -73,9 +172,21 @@ class TeamEloCalculator:
         self.archive_path = archive_path
         self.db_path = db_path
         self.initial_rating = initial_rating
-        self.team_ratings = {}
+        # Team ratings (Structure of Arrays): each lineage gets a dense index
+        # into parallel arrays, with one set of Glicko-2 arrays per session
+        # Structure: {lineage_id: index}
+        self.lineage_index = {}
+        self.ratings = {}
+        self.matchups = {}
+        self.total_races = None
+        self.first_race_id = None
+        self.last_race_id = None
         self.team_info = {}
+        self.constructor_lineage = {}
+        self.pair_keys = None
+        self.driver_ids = None
         self.driver_elos = {}
+        self.lineage_performance = {}
         self.tau = 0.5
         
         self.load_data()
@@ -85,15 +196,25 @@ class TeamEloCalculator:
         print("Loading data...")
         
         # Load constructors
-        self.constructors_df = pd.read_csv(os.path.join(self.archive_path, 'constructors.csv'))
+        # Only parse the columns the model uses (the archive files carry URLs,
+        # times and session dates we never read)
+        self.constructors_df = pd.read_csv(os.path.join(self.archive_path, 'constructors.csv'),
+                                           usecols=['constructorId', 'constructorRef', 'name'])
         print(f"✓ Loaded {len(self.constructors_df)} constructors")
         
         # Load results from archive (has grid positions)
-        self.results_df = pd.read_csv(os.path.join(self.archive_path, 'results.csv'))
+        self.results_df = pd.read_csv(os.path.join(self.archive_path, 'results.csv'),
+                                      usecols=['raceId', 'driverId', 'constructorId', 'grid', 'positionOrder'],
+                                      dtype={'raceId': 'int32', 'driverId': 'int32', 'constructorId': 'int32',
+                                             'grid': 'int16', 'positionOrder': 'int16'},
+                                      na_values=['\\N'])
         print(f"✓ Loaded {len(self.results_df)} race results")
         
         # Load races
-        self.races_df = pd.read_csv(os.path.join(self.archive_path, 'races.csv'))
+        self.races_df = pd.read_csv(os.path.join(self.archive_path, 'races.csv'),
+                                    usecols=['raceId', 'year', 'round'],
+                                    dtype={'raceId': 'int32', 'year': 'int16', 'round': 'int16'},
+                                    na_values=['\\N'])
         print(f"✓ Loaded {len(self.races_df)} races")
         
         # Load driver Elos from database
@@ -104,312 +225,279 @@ class TeamEloCalculator:
         """, conn)
         conn.close()
         
-        self.driver_elos = {}
-        for _, row in driver_elo_df.iterrows():
-            self.driver_elos[row['driver_id']] = {
-                'global': row['global_elo'],
-                'qualifying': row['qualifying_elo'],
-                'race': row['race_elo']
-            }
-        print(f"✓ Loaded {len(self.driver_elos)} driver Elos from database\n")
-        
-        # Initialize team ratings
-        for _, constructor in self.constructors_df.iterrows():
-            constructor_ref = constructor['constructorRef']
+        # Driver Elos as dense arrays: each driver with an Elo gets an index
+        # 0..D-1 into one contiguous array per session type
+        driver_elo_df = driver_elo_df.sort_values('driver_id')
+        self.driver_ids = driver_elo_df['driver_id'].to_numpy()
+        self.driver_elos = {
+            'global': driver_elo_df['global_elo'].to_numpy(dtype=np.float64),
+            'qualifying': driver_elo_df['qualifying_elo'].to_numpy(dtype=np.float64),
+            'race': driver_elo_df['race_elo'].to_numpy(dtype=np.float64),
+        }
+        print(f"✓ Loaded {len(self.driver_ids)} driver Elos from database\n")
+        
+        # Results as plain column arrays sorted by race, instead of
+        # filtering (and wrapping) DataFrames per race:
+        # (race_ids, constructor_ids, driver_idx, positions, grids), where
+        # driver_idx is the dense driver index (-1 = no driver Elo).
+        order = np.argsort(self.results_df['raceId'].to_numpy(), kind='stable')
+        race_ids = self.results_df['raceId'].to_numpy()[order]
+        columns = [self.results_df[column].to_numpy()[order]
+                   for column in ('constructorId', 'driverId', 'positionOrder', 'grid')]
+        columns[1] = self.driver_index(columns[1])
+        self.results = (race_ids, *columns)
+        # One key per (race, constructor) result pair, shared by the
+        # performance and participation passes
+        self.pair_keys = (race_ids.astype(np.int64) * (int(columns[0].max(initial=0)) + 1)
+                          + columns[0])
+        
+        # Initialize team ratings, and resolve every constructor's lineage
+        # once so the race loop does a dict lookup instead of scanning
+        # constructors_df
+        for constructor in self.constructors_df.itertuples(index=False):
+            constructor_ref = constructor.constructorRef
             lineage_id = ConstructorLineage.get_lineage(constructor_ref)
+            self.constructor_lineage.setdefault(constructor.constructorId, lineage_id)
             
-            if lineage_id not in self.team_ratings:
-                self.team_ratings[lineage_id] = {
-                    'qualifying': Glicko2Rating(),
-                    'race': Glicko2Rating(),
-                    'first_race_id': None,
-                    'last_race_id': None,
-                    'total_races': 0,
-                    'qualifying_matchups': 0,
-                    'race_matchups': 0
-                }
+            if lineage_id not in self.lineage_index:
+                self.lineage_index[lineage_id] = len(self.lineage_index)
                 self.team_info[lineage_id] = {
-                    'name': constructor['name'],
+                    'name': constructor.name,
                     'constructor_ids': [],
                     'constructor_refs': []
                 }
             
-            if constructor['constructorId'] not in self.team_info[lineage_id]['constructor_ids']:
-                self.team_info[lineage_id]['constructor_ids'].append(constructor['constructorId'])
+            if constructor.constructorId not in self.team_info[lineage_id]['constructor_ids']:
+                self.team_info[lineage_id]['constructor_ids'].append(constructor.constructorId)
                 self.team_info[lineage_id]['constructor_refs'].append(constructor_ref)
-                self.team_info[lineage_id]['name'] = constructor['name']
+                self.team_info[lineage_id]['name'] = constructor.name
+        
+        # Every lineage starts at r=1500, RD=350 (high uncertainty), σ=0.06
+        lineage_count = len(self.lineage_index)
+        for session_type in ('qualifying', 'race'):
+            self.ratings[session_type] = {
+                'rating': np.full(lineage_count, 1500.0),
+                'rd': np.full(lineage_count, 350.0),
+                'volatility': np.full(lineage_count, 0.06),
+            }
+            self.matchups[session_type] = np.zeros(lineage_count, dtype=np.int64)
+        self.total_races = np.zeros(lineage_count, dtype=np.int64)
+        # Ids of each lineage's first and last race (0 = has not raced)
+        self.first_race_id = np.zeros(lineage_count, dtype=np.int64)
+        self.last_race_id = np.zeros(lineage_count, dtype=np.int64)
     
     def g_function(self, phi):
         return 1 / np.sqrt(1 + 3 * phi**2 / np.pi**2)
     
-    def E_function(self, mu, mu_j, phi_j):
-        exponent = -self.g_function(phi_j) * (mu - mu_j)
+    def E_function(self, mu, mu_j, g_phi_j):
+        """Expected scores against opponents with precomputed g(phi_j)"""
+        exponent = -g_phi_j * (mu - mu_j)
         exponent = np.clip(exponent, -500, 500)
         return 1 / (1 + np.exp(exponent))
     
-    def update_glicko2(self, rating, opponents, outcomes):
-        """Update Glicko-2 rating after a rating period"""
-        if not opponents:
-            rating.rd = min(350, np.sqrt(rating.rd**2 + rating.volatility**2))
+    def update_glicko2(self, session_type, index, opponents, outcomes):
+        """
+        Update lineage `index`'s Glicko-2 rating for one session after a
+        rating period against the lineages at indexes `opponents`
+        """
+        ratings = self.ratings[session_type]
+        if len(opponents) == 0:
+            ratings['rd'][index] = min(350, np.sqrt(ratings['rd'][index]**2 + ratings['volatility'][index]**2))
             return
         
-        mu, phi = rating.to_glicko_scale()
+        # Convert to the Glicko-2 scale
+        mu = (ratings['rating'][index] - 1500) / 173.7178
+        phi = ratings['rd'][index] / 173.7178
+        
+        # Opponent terms as arrays - g(phi_j) and E are computed once and
+        # shared by the variance, delta and rating update sums
+        mu_j = (ratings['rating'][opponents] - 1500) / 173.7178
+        phi_j = ratings['rd'][opponents] / 173.7178
+        g_phi_j = self.g_function(phi_j)
+        E_vals = self.E_function(mu, mu_j, g_phi_j)
         
         # Calculate v (variance)
-        v_sum = 0
-        for opp in opponents:
-            mu_j, phi_j = opp.to_glicko_scale()
-            g_phi_j = self.g_function(phi_j)
-            E_val = self.E_function(mu, mu_j, phi_j)
-            v_sum += g_phi_j**2 * E_val * (1 - E_val)
+        v_sum = (g_phi_j**2 * E_vals * (1 - E_vals)).sum()
         v = 1 / v_sum if v_sum > 0 else 1e10
         
         # Calculate delta
-        delta_sum = 0
-        for opp, outcome in zip(opponents, outcomes):
-            mu_j, phi_j = opp.to_glicko_scale()
-            g_phi_j = self.g_function(phi_j)
-            E_val = self.E_function(mu, mu_j, phi_j)
-            delta_sum += g_phi_j * (outcome - E_val)
+        delta_sum = (g_phi_j * (outcomes - E_vals)).sum()
         delta = v * delta_sum
         
         # Calculate new volatility
-        sigma = rating.volatility
-        a = np.log(sigma**2)
-        
-        def f(x):
-            ex = np.exp(x)
-            num1 = ex * (delta**2 - phi**2 - v - ex)
-            denom1 = 2 * ((phi**2 + v + ex)**2)
-            num2 = x - a
-            denom2 = self.tau**2
-            return num1/denom1 - num2/denom2
-        
-        A = a
-        if delta**2 > phi**2 + v:
-            B = np.log(delta**2 - phi**2 - v)
-        else:
-            k = 1
-            while k < 100 and f(a - k * self.tau) < 0:
-                k += 1
-            B = a - k * self.tau
-        
-        fA = f(A)
-        fB = f(B)
-        
-        epsilon = 0.000001
-        max_iterations = 100
-        iteration = 0
-        while abs(B - A) > epsilon and iteration < max_iterations:
-            C = A + (A - B) * fA / (fB - fA)
-            fC = f(C)
-            if fC * fB < 0:
-                A = B
-                fA = fB
-            else:
-                fA = fA / 2
-            B = C
-            fB = fC
-            iteration += 1
-        
-        new_sigma = np.exp(A / 2)
-        new_sigma = np.clip(new_sigma, 0.01, 0.5)
-        
-        # Update phi and mu
-        phi_star = np.sqrt(phi**2 + new_sigma**2)
-        new_phi = 1 / np.sqrt(1/phi_star**2 + 1/v)
-        
-        mu_update = 0
-        for opp, outcome in zip(opponents, outcomes):
-            mu_j, phi_j = opp.to_glicko_scale()
-            g_phi_j = self.g_function(phi_j)
-            E_val = self.E_function(mu, mu_j, phi_j)
-            mu_update += g_phi_j * (outcome - E_val)
-        new_mu = mu + new_phi**2 * mu_update
-        
-        rating.from_glicko_scale(new_mu, new_phi)
-        rating.volatility = new_sigma
-        
-        # Apply bounds
-        rating.rating = np.clip(rating.rating, 800, 2200)
-        rating.rd = np.clip(rating.rd, 30, 350)
+        new_sigma = solve_volatility(float(delta), float(phi), float(v),
+                                     float(ratings['volatility'][index]), float(self.tau))
+        new_sigma = min(max(new_sigma, 0.01), 0.5)
+        
+        # Update phi and mu (scalars: math, not numpy)
+        phi_star = math.sqrt(phi**2 + new_sigma**2)
+        new_phi = 1 / math.sqrt(1/phi_star**2 + 1/v)
+        
+        # The rating update uses the same sum as delta
+        new_mu = mu + new_phi**2 * delta_sum
+        
+        # Convert back, applying bounds (plain min/max: np.clip on a scalar
+        # costs more than the rest of the update arithmetic)
+        ratings['rating'][index] = min(max(new_mu * 173.7178 + 1500, 800), 2200)
+        ratings['rd'][index] = min(max(new_phi * 173.7178, 30), 350)
+        ratings['volatility'][index] = new_sigma
     
-    def get_driver_adjusted_performance(self, race_id, constructor_id, session_type='race'):
+    def get_lineage_performances(self, session_type='race'):
         """
-        Get team's performance ADJUSTED for driver skill
-        This is the key innovation of Method B
+        Get every team's performance ADJUSTED for driver skill, for all races
+        at once. This is the key innovation of Method B
         
         Raw Performance = Car Performance + Driver Skill
         Therefore: Car Performance = Raw Performance - Driver Skill
-        """
-        race_results = self.results_df[
-            (self.results_df['raceId'] == race_id) &
-            (self.results_df['constructorId'] == constructor_id)
-        ]
         
-        if race_results.empty:
-            return None, 0
+        Returns {race_id: {lineage_id: adjusted_performance}}, lineages in the
+        order their constructors first appear in the race's results, each
+        scored by its best constructor.
+        """
+        race_ids, constructor_ids, driver_idx, positions, grids = self.results
+        finish = positions if session_type == 'race' else grids
+        if len(race_ids) == 0:
+            return {}
+        
+        # One key per (race, constructor); rows are already in race order
+        pair_keys = self.pair_keys
+        
+        # Where each constructor first appears in each race (qualifying only
+        # looks at cars with a grid slot)
+        entered = np.arange(len(finish)) if session_type == 'race' else np.flatnonzero(grids > 0)
+        entered_keys, first_seen = np.unique(pair_keys[entered], return_index=True)
+        first_seen = entered[first_seen]
+        
+        # Skip drivers with no Elo available, and results without a
+        # position, then group by (race, constructor) keeping result order
+        counted = np.flatnonzero((driver_idx >= 0) & (finish > 0))
+        if len(counted) == 0:
+            return {}
+        counted = counted[np.argsort(pair_keys[counted], kind='stable')]
+        
+        # Convert position to performance score (lower position = better)
+        # Scale: position 1 = score 100, position 20 = score 0
+        raw_performance = POSITION_SCORE_ARRAY[np.minimum(finish[counted], 21)]
+        driver_elo = self.driver_elos[session_type][driver_idx[counted]]
+        
+        # Adjust for driver skill
+        # Driver skill contribution: (driver_elo - 1500) / 10 
+        # This scaling factor can be tuned
+        driver_contribution = (driver_elo - 1500) / 10
+        
+        # Car performance = Raw - Driver contribution
+        adjusted_performances = raw_performance - driver_contribution
+        
+        # Average the adjusted performances of each team's drivers
+        group_keys, group_starts, group_sizes = np.unique(pair_keys[counted], return_index=True,
+                                                          return_counts=True)
+        averages = np.add.reduceat(adjusted_performances, group_starts) / group_sizes
+        
+        # Visit teams in order of appearance, keeping each lineage's best
+        appearance = np.argsort(first_seen[np.searchsorted(entered_keys, group_keys)])
+        group_rows = counted[group_starts[appearance]]
+        
+        performances = {}
+        for race_id, constructor_id, adjusted_perf in zip(race_ids[group_rows].tolist(),
+                                                          constructor_ids[group_rows].tolist(),
+                                                          averages[appearance].tolist()):
+            lineage_id = self.constructor_lineage.get(constructor_id)
+            if lineage_id is None:
+                continue
+            
+            lineage_performance = performances.setdefault(race_id, {})
+            if lineage_id not in lineage_performance or adjusted_perf > lineage_performance[lineage_id]:
+                lineage_performance[lineage_id] = adjusted_perf
         
-        adjusted_performances = []
+        return performances
+    
+    def track_participation(self, race_order):
+        """
+        Count each lineage's races (once per constructor entered in a race)
+        and find its first and last race, given race ids in calculation order
+        """
+        race_ids, constructor_ids = self.results[:2]
+        if len(race_ids) == 0 or len(race_order) == 0:
+            return
         
-        for _, result in race_results.iterrows():
-            driver_id = result['driverId']
-            
-            # Get driver Elo
-            if driver_id not in self.driver_elos:
-                continue  # Skip if no driver Elo available
-            
-            driver_elo = self.driver_elos[driver_id].get(session_type if session_type != 'qualifying' else 'qualifying', 1500)
-            
-            if session_type == 'race':
-                position = result.get('positionOrder', result.get('position'))
-                if pd.notna(position) and position > 0:
-                    # Convert position to performance score (lower position = better)
-                    # Scale: position 1 = score 100, position 20 = score 0
-                    raw_performance = max(0, 100 - (position - 1) * 5)
-                    
-                    # Adjust for driver skill
-                    # Driver skill contribution: (driver_elo - 1500) / 10 
-                    # This scaling factor can be tuned
-                    driver_contribution = (driver_elo - 1500) / 10
-                    
-                    # Car performance = Raw - Driver contribution
-                    car_performance = raw_performance - driver_contribution
-                    adjusted_performances.append(car_performance)
-            else:  # qualifying
-                grid = result.get('grid')
-                if pd.notna(grid) and grid > 0:
-                    raw_performance = max(0, 100 - (grid - 1) * 5)
-                    driver_contribution = (driver_elo - 1500) / 10
-                    car_performance = raw_performance - driver_contribution
-                    adjusted_performances.append(car_performance)
-        
-        if not adjusted_performances:
-            return None, 0
-        
-        # Average the adjusted performances
-        avg_adjusted = sum(adjusted_performances) / len(adjusted_performances)
-        return avg_adjusted, len(adjusted_performances)
+        # Distinct (race, constructor) pairs, from the shared group keys
+        _, pair_rows = np.unique(self.pair_keys, return_index=True)
+        pair_races = race_ids[pair_rows]
+        pair_constructors = constructor_ids[pair_rows]
+        
+        # Position of each pair's race in calculation order (-1 = not a
+        # race being calculated)
+        sorted_order = np.argsort(race_order, kind='stable')
+        slot = np.minimum(np.searchsorted(race_order, pair_races, sorter=sorted_order), len(race_order) - 1)
+        race_rank = np.where(race_order[sorted_order[slot]] == pair_races, sorted_order[slot], -1)
+        
+        # Lineage index of each pair's constructor (-1 = unknown constructor)
+        lineage_of = np.full(int(pair_constructors.max()) + 1, -1, dtype=np.intp)
+        for constructor_id, lineage_id in self.constructor_lineage.items():
+            if 0 <= constructor_id < len(lineage_of):
+                lineage_of[constructor_id] = self.lineage_index[lineage_id]
+        pair_lineages = lineage_of[pair_constructors]
+        
+        counted = (race_rank >= 0) & (pair_lineages >= 0)
+        race_rank = race_rank[counted]
+        pair_lineages = pair_lineages[counted]
+        
+        lineage_count = len(self.lineage_index)
+        self.total_races += np.bincount(pair_lineages, minlength=lineage_count)
+        first_rank = np.full(lineage_count, len(race_order))
+        last_rank = np.full(lineage_count, -1)
+        np.minimum.at(first_rank, pair_lineages, race_rank)
+        np.maximum.at(last_rank, pair_lineages, race_rank)
+        raced = last_rank >= 0
+        self.first_race_id[raced] = race_order[first_rank[raced]]
+        self.last_race_id[raced] = race_order[last_rank[raced]]
+    
+    def driver_index(self, driver_ids):
+        """Map driver ids to dense indexes into the driver Elo arrays (-1 if unknown)"""
+        if len(self.driver_ids) == 0:
+            return np.full(len(driver_ids), -1, dtype=np.intp)
+        idx = np.minimum(np.searchsorted(self.driver_ids, driver_ids), len(self.driver_ids) - 1)
+        return np.where(self.driver_ids[idx] == driver_ids, idx, -1)
     
     def process_race_matchups(self, race_id):
         """Process H2H matchups using driver-adjusted performance"""
-        race_constructors = self.results_df[self.results_df['raceId'] == race_id]['constructorId'].unique()
-        
-        lineage_performance = {}
-        for constructor_id in race_constructors:
-            constructor_row = self.constructors_df[self.constructors_df['constructorId'] == constructor_id]
-            if constructor_row.empty:
-                continue
-            
-            constructor_ref = constructor_row.iloc[0]['constructorRef']
-            lineage_id = ConstructorLineage.get_lineage(constructor_ref)
-            
-            adjusted_perf, driver_count = self.get_driver_adjusted_performance(race_id, constructor_id, 'race')
-            
-            if adjusted_perf is not None and driver_count > 0:
-                if lineage_id not in lineage_performance or adjusted_perf > lineage_performance[lineage_id]:
-                    lineage_performance[lineage_id] = adjusted_perf
-        
-        if len(lineage_performance) < 2:
-            return 0
-        
-        updates = {}
-        for lineage_id in lineage_performance:
-            updates[lineage_id] = {'opponents': [], 'outcomes': []}
-        
-        lineages = list(lineage_performance.keys())
-        matchup_count = 0
-        
-        for i, lineage_a in enumerate(lineages):
-            for lineage_b in lineages[i+1:]:
-                perf_a = lineage_performance[lineage_a]
-                perf_b = lineage_performance[lineage_b]
-                
-                # Higher adjusted performance = win
-                if perf_a > perf_b:
-                    outcome_a, outcome_b = 1.0, 0.0
-                elif perf_a < perf_b:
-                    outcome_a, outcome_b = 0.0, 1.0
-                else:
-                    outcome_a, outcome_b = 0.5, 0.5
-                
-                rating_a = self.team_ratings[lineage_a]['race']
-                rating_b = self.team_ratings[lineage_b]['race']
-                
-                updates[lineage_a]['opponents'].append(rating_b)
-                updates[lineage_a]['outcomes'].append(outcome_a)
-                updates[lineage_b]['opponents'].append(rating_a)
-                updates[lineage_b]['outcomes'].append(outcome_b)
-                
-                matchup_count += 1
-        
-        for lineage_id, update_data in updates.items():
-            rating = self.team_ratings[lineage_id]['race']
-            opponent_copies = [Glicko2Rating(r.rating, r.rd, r.volatility) for r in update_data['opponents']]
-            self.update_glicko2(rating, opponent_copies, update_data['outcomes'])
-            self.team_ratings[lineage_id]['race_matchups'] += len(update_data['outcomes'])
-        
-        return matchup_count
+        return self.process_session_matchups(race_id, 'race')
     
     def process_qualifying_matchups(self, race_id):
         """Process qualifying H2H matchups using driver-adjusted performance"""
-        race_results = self.results_df[self.results_df['raceId'] == race_id]
-        quali_constructors = race_results[race_results['grid'].notna() & (race_results['grid'] > 0)]['constructorId'].unique()
-        
-        lineage_performance = {}
-        for constructor_id in quali_constructors:
-            constructor_row = self.constructors_df[self.constructors_df['constructorId'] == constructor_id]
-            if constructor_row.empty:
-                continue
-            
-            constructor_ref = constructor_row.iloc[0]['constructorRef']
-            lineage_id = ConstructorLineage.get_lineage(constructor_ref)
-            
-            adjusted_perf, driver_count = self.get_driver_adjusted_performance(race_id, constructor_id, 'qualifying')
-            
-            if adjusted_perf is not None and driver_count > 0:
-                if lineage_id not in lineage_performance or adjusted_perf > lineage_performance[lineage_id]:
-                    lineage_performance[lineage_id] = adjusted_perf
+        return self.process_session_matchups(race_id, 'qualifying')
+    
+    def process_session_matchups(self, race_id, session_type):
+        """
+        Every lineage in the race plays every other one: higher adjusted
+        performance = win. Each lineage is then updated against all its
+        opponents, in order of appearance (by the compiled kernel when
+        numba is installed).
+        """
+        lineage_performance = self.lineage_performance[session_type].get(race_id, {})
         
-        if len(lineage_performance) < 2:
+        lineage_count = len(lineage_performance)
+        if lineage_count < 2:
             return 0
         
-        updates = {}
-        for lineage_id in lineage_performance:
-            updates[lineage_id] = {'opponents': [], 'outcomes': []}
-        
-        lineages = list(lineage_performance.keys())
-        matchup_count = 0
-        
-        for i, lineage_a in enumerate(lineages):
-            for lineage_b in lineages[i+1:]:
-                perf_a = lineage_performance[lineage_a]
-                perf_b = lineage_performance[lineage_b]
-                
-                if perf_a > perf_b:
-                    outcome_a, outcome_b = 1.0, 0.0
-                elif perf_a < perf_b:
-                    outcome_a, outcome_b = 0.0, 1.0
-                else:
-                    outcome_a, outcome_b = 0.5, 0.5
-                
-                rating_a = self.team_ratings[lineage_a]['qualifying']
-                rating_b = self.team_ratings[lineage_b]['qualifying']
-                
-                updates[lineage_a]['opponents'].append(rating_b)
-                updates[lineage_a]['outcomes'].append(outcome_a)
-                updates[lineage_b]['opponents'].append(rating_a)
-                updates[lineage_b]['outcomes'].append(outcome_b)
-                
-                matchup_count += 1
-        
-        for lineage_id, update_data in updates.items():
-            rating = self.team_ratings[lineage_id]['qualifying']
-            opponent_copies = [Glicko2Rating(r.rating, r.rd, r.volatility) for r in update_data['opponents']]
-            self.update_glicko2(rating, opponent_copies, update_data['outcomes'])
-            self.team_ratings[lineage_id]['qualifying_matchups'] += len(update_data['outcomes'])
-        
-        return matchup_count
+        performance = np.fromiter(lineage_performance.values(), dtype=np.float64, count=lineage_count)
+        indexes = np.fromiter((self.lineage_index[lineage_id] for lineage_id in lineage_performance),
+                              dtype=np.intp, count=lineage_count)
+        
+        if HAVE_NUMBA:
+            ratings = self.ratings[session_type]
+            update_session_ratings(ratings['rating'], ratings['rd'], ratings['volatility'],
+                                   indexes, performance, self.tau)
+        else:
+            # outcomes[a, b]: lineage a's score against lineage b (1 win, 0.5 tie, 0 loss)
+            outcomes = np.where(performance[:, None] > performance[None, :], 1.0,
+                                np.where(performance[:, None] < performance[None, :], 0.0, 0.5))
+            opponents_of = ~np.eye(lineage_count, dtype=bool)
+            for i in range(lineage_count):
+                self.update_glicko2(session_type, indexes[i], indexes[opponents_of[i]], outcomes[i][opponents_of[i]])
+        self.matchups[session_type][indexes] += lineage_count - 1
+        
+        return lineage_count * (lineage_count - 1) // 2
     
     def calculate_all_ratings(self):
         """Main calculation loop"""
@@ -424,14 +512,20 @@ class TeamEloCalculator:
         print("Formula: Car Performance = Raw Performance - Driver Skill Contribution")
         print("=" * 80 + "\n")
         
+        # Driver-adjusted performances for every race, computed up front
+        self.lineage_performance = {
+            'qualifying': self.get_lineage_performances('qualifying'),
+            'race': self.get_lineage_performances('race'),
+        }
+        
         total_quali_matchups = 0
         total_race_matchups = 0
         
-        races = self.races_df.sort_values(['year', 'round']).iterrows()
+        races_df = self.races_df.sort_values(['year', 'round'])
+        self.track_participation(races_df['raceId'].to_numpy())
+        races = races_df[['raceId', 'year']].itertuples(index=False, name=None)
         
-        for idx, (_, race) in enumerate(races, 1):
-            race_id = race['raceId']
-            year = race['year']
+        for idx, (race_id, year) in enumerate(races, 1):
             
             quali_matchups = self.process_qualifying_matchups(race_id)
             race_matchups = self.process_race_matchups(race_id)
@@ -439,19 +533,6 @@ class TeamEloCalculator:
             total_quali_matchups += quali_matchups
             total_race_matchups += race_matchups
             
-            # Track participation
-            race_constructors = self.results_df[self.results_df['raceId'] == race_id]['constructorId'].unique()
-            for constructor_id in race_constructors:
-                constructor_row = self.constructors_df[self.constructors_df['constructorId'] == constructor_id]
-                if not constructor_row.empty:
-                    constructor_ref = constructor_row.iloc[0]['constructorRef']
-                    lineage_id = ConstructorLineage.get_lineage(constructor_ref)
-                    
-                    if self.team_ratings[lineage_id]['first_race_id'] is None:
-                        self.team_ratings[lineage_id]['first_race_id'] = race_id
-                    self.team_ratings[lineage_id]['last_race_id'] = race_id
-                    self.team_ratings[lineage_id]['total_races'] += 1
-            
             if idx % 100 == 0:
                 print(f"Processed {idx} races (year {year})... (Q: {total_quali_matchups}, R: {total_race_matchups} matchups)")
         
@@ -460,54 +541,44 @@ class TeamEloCalculator:
         print(f"Total Races Processed: {len(self.races_df)}")
         print(f"Total Qualifying Matchups: {total_quali_matchups}")
         print(f"Total Race Matchups: {total_race_matchups}")
-        print(f"Teams Rated: {len([t for t in self.team_ratings.values() if t['total_races'] > 0])}")
+        print(f"Teams Rated: {np.count_nonzero(self.total_races > 0)}")
         print("=" * 80)
     
-    def calculate_global_rating(self, lineage_id):
-        quali_rating = self.team_ratings[lineage_id]['qualifying'].rating
-        race_rating = self.team_ratings[lineage_id]['race'].rating
-        return 0.3 * quali_rating + 0.7 * race_rating
-    
-    def calculate_conservative_global(self, lineage_id):
-        quali = self.team_ratings[lineage_id]['qualifying']
-        race = self.team_ratings[lineage_id]['race']
-        quali_conservative = quali.rating - 2 * quali.rd
-        race_conservative = race.rating - 2 * race.rd
-        return 0.3 * quali_conservative + 0.7 * race_conservative
+    def get_team_columns(self):
+        """Team ratings as column arrays, for teams with at least one race"""
+        quali = self.ratings['qualifying']
+        race = self.ratings['race']
+        rated = np.flatnonzero(self.total_races > 0)
+        lineage_ids = list(self.lineage_index)
+        info = [self.team_info[lineage_ids[index]] for index in rated]
+        
+        quali_rating = quali['rating'][rated]
+        race_rating = race['rating'][rated]
+        quali_rd = quali['rd'][rated]
+        race_rd = race['rd'][rated]
+        
+        return {
+            'lineage_id': [lineage_ids[index] for index in rated],
+            'name': [team['name'] for team in info],
+            'global_rating': 0.3 * quali_rating + 0.7 * race_rating,
+            'conservative_rating': 0.3 * (quali_rating - 2 * quali_rd) + 0.7 * (race_rating - 2 * race_rd),
+            'quali_rating': quali_rating,
+            'race_rating': race_rating,
+            'avg_rd': (quali_rd + race_rd) / 2,
+            'quali_rd': quali_rd,
+            'race_rd': race_rd,
+            'quali_volatility': quali['volatility'][rated],
+            'race_volatility': race['volatility'][rated],
+            'total_races': self.total_races[rated].tolist(),
+            'total_matchups': (self.matchups['qualifying'][rated] + self.matchups['race'][rated]).tolist(),
+            'constructor_ids': [team['constructor_ids'] for team in info]
+        }
     
     def get_team_data_for_export(self):
         """Prepare team data for export/display"""
-        team_data = []
-        for lineage_id, ratings in self.team_ratings.items():
-            if ratings['total_races'] == 0:
-                continue
-            
-            info = self.team_info[lineage_id]
-            global_rating = self.calculate_global_rating(lineage_id)
-            conservative_rating = self.calculate_conservative_global(lineage_id)
-            
-            quali = ratings['qualifying']
-            race = ratings['race']
-            avg_rd = (quali.rd + race.rd) / 2
-            
-            team_data.append({
-                'lineage_id': lineage_id,
-                'name': info['name'],
-                'global_rating': global_rating,
-                'conservative_rating': conservative_rating,
-                'quali_rating': quali.rating,
-                'race_rating': race.rating,
-                'avg_rd': avg_rd,
-                'quali_rd': quali.rd,
-                'race_rd': race.rd,
-                'quali_volatility': quali.volatility,
-                'race_volatility': race.volatility,
-                'total_races': ratings['total_races'],
-                'total_matchups': ratings['qualifying_matchups'] + ratings['race_matchups'],
-                'constructor_ids': info['constructor_ids']
-            })
-        
-        return team_data
+        columns = self.get_team_columns()
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
     
     def save_to_database(self):
         """Save team ratings to database"""
@@ -516,6 +587,10 @@ class TeamEloCalculator:
         print("=" * 80)
         
         conn = sqlite3.connect(self.db_path)
+        # WAL lets the web app keep reading while ratings are rewritten, and
+        # NORMAL sync is safe in WAL mode (no fsync on every commit)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
         
         # Check if Team_Elo_Glicko2 table exists, if not create it
@@ -542,24 +617,9 @@ class TeamEloCalculator:
             )
         """)
         
-        # Clear existing data
-        cursor.execute("DELETE FROM Team_Elo_Glicko2 WHERE calculation_method = 'Driver_Adjusted_Glicko2'")
-        
         team_data = self.get_team_data_for_export()
-        saved_count = 0
-        
-        for team in team_data:
-            # Convert constructor_ids list to comma-separated string
-            constructor_ids_str = ','.join(map(str, team['constructor_ids']))
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO Team_Elo_Glicko2 (
-                    lineage_id, team_name, qualifying_rating, race_rating,
-                    global_rating, conservative_rating, qualifying_rd, race_rd,
-                    avg_rd, qualifying_volatility, race_volatility,
-                    total_races, total_matchups, constructor_ids, calculation_method
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+        rows = [
+            (
                 team['lineage_id'],
                 team['name'],
                 round(team['quali_rating'], 2),
@@ -573,22 +633,36 @@ class TeamEloCalculator:
                 round(team['race_volatility'], 4),
                 team['total_races'],
                 team['total_matchups'],
-                constructor_ids_str,
+                # Convert constructor_ids list to comma-separated string
+                ','.join(map(str, team['constructor_ids'])),
                 'Driver_Adjusted_Glicko2'
-            ))
-            saved_count += 1
+            )
+            for team in team_data
+        ]
+        
+        # Replace the existing ratings in one transaction with one prepared
+        # statement
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM Team_Elo_Glicko2 WHERE calculation_method = 'Driver_Adjusted_Glicko2'")
+        cursor.executemany("""
+            INSERT OR REPLACE INTO Team_Elo_Glicko2 (
+                lineage_id, team_name, qualifying_rating, race_rating,
+                global_rating, conservative_rating, qualifying_rd, race_rd,
+                avg_rd, qualifying_volatility, race_volatility,
+                total_races, total_matchups, constructor_ids, calculation_method
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
         
         conn.commit()
         conn.close()
         
-        print(f"✓ Saved {saved_count} team ratings to Team_Elo_Glicko2 table")
+        print(f"✓ Saved {len(rows)} team ratings to Team_Elo_Glicko2 table")
         print(f"✓ Calculation method: Driver_Adjusted_Glicko2")
         print("=" * 80)
     
     def display_top_teams(self, limit=25):
         """Display top teams"""
-        team_data = self.get_team_data_for_export()
-        df = pd.DataFrame(team_data)
+        df = pd.DataFrame(self.get_team_columns())
         
         # Raw ratings
         df_raw = df.sort_values('global_rating', ascending=False).head(limit)
@@ -599,10 +673,10 @@ class TeamEloCalculator:
         print(f"{'Rank':<6}{'Team':<25}{'Global':<10}{'Quali':<10}{'Race':<10}{'Avg RD':<10}{'Races':<8}")
         print("-" * 100)
         
-        for rank, (_, row) in enumerate(df_raw.iterrows(), 1):
-            print(f"{rank:<6}{row['name'][:24]:<25}"
-                  f"{row['global_rating']:<10.1f}{row['quali_rating']:<10.1f}"
-                  f"{row['race_rating']:<10.1f}{row['avg_rd']:<10.1f}{row['total_races']:<8}")
+        for rank, row in enumerate(df_raw.itertuples(index=False), 1):
+            print(f"{rank:<6}{row.name[:24]:<25}"
+                  f"{row.global_rating:<10.1f}{row.quali_rating:<10.1f}"
+                  f"{row.race_rating:<10.1f}{row.avg_rd:<10.1f}{row.total_races:<8}")
         
         # Conservative ratings
         df_conservative = df.sort_values('conservative_rating', ascending=False).head(limit)
@@ -613,19 +687,19 @@ class TeamEloCalculator:
         print(f"{'Rank':<6}{'Team':<25}{'Conservative':<14}{'Global':<10}{'Avg RD':<10}{'Confidence':<12}")
         print("-" * 100)
         
-        for rank, (_, row) in enumerate(df_conservative.iterrows(), 1):
-            if row['avg_rd'] < 50:
+        for rank, row in enumerate(df_conservative.itertuples(index=False), 1):
+            if row.avg_rd < 50:
                 confidence = "Very High"
-            elif row['avg_rd'] < 100:
+            elif row.avg_rd < 100:
                 confidence = "High"
-            elif row['avg_rd'] < 150:
+            elif row.avg_rd < 150:
                 confidence = "Moderate"
             else:
                 confidence = "Low"
             
-            print(f"{rank:<6}{row['name'][:24]:<25}"
-                  f"{row['conservative_rating']:<14.1f}{row['global_rating']:<10.1f}"
-                  f"{row['avg_rd']:<10.1f}{confidence:<12}")
+            print(f"{rank:<6}{row.name[:24]:<25}"
+                  f"{row.conservative_rating:<14.1f}{row.global_rating:<10.1f}"
+                  f"{row.avg_rd:<10.1f}{confidence:<12}")
         
         print("\n" + "=" * 100)
         print("KEY DIFFERENCE FROM METHOD A (Raw H2H):")
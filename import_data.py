@@ -5,9 +5,9 @@ Works with MySQL, PostgreSQL, SQLite, and other databases via SQLAlchemy
 """
 
 import pandas as pd
-import sqlite3
 from pathlib import Path
 from datetime import datetime
+from config import open_db
 
 # Configuration
 CSV_DIR = Path('d:/f1-elo/archive')
@@ -23,7 +23,9 @@ def import_data_sqlite():
     """Import all CSV files into SQLite database"""
     
     print("Creating database connection...")
-    conn = sqlite3.connect(DB_PATH)
+    # Writable connection: switches the file to WAL (persistent), so the
+    # web app's read-only connections never block on later ELO updates
+    conn = open_db(DB_PATH, readonly=False)
     cursor = conn.cursor()
     
     try:
@@ -38,6 +40,9 @@ def import_data_sqlite():
         df.to_sql('Status', conn, if_exists='append', index=False)
         print(f"   Imported {len(df)} status records")
         
+        # Status descriptions indexed by id, for mapping result status ids
+        status_lookup = df.set_index('status_id')['status_description']
+        
         # 2. Import Team (from constructors)
         print("\n2. Importing Team data...")
         df = pd.read_csv(CSV_DIR / 'constructors.csv')
@@ -99,10 +104,6 @@ def import_data_sqlite():
         print("\n6. Importing Result data...")
         df = pd.read_csv(CSV_DIR / 'results.csv', na_values=['\\N'])
         
-        # Get status descriptions
-        status_df = pd.read_csv(CSV_DIR / 'status.csv')
-        status_dict = dict(zip(status_df['statusId'], status_df['status']))
-        
         # Check for duplicates
         df['is_duplicate'] = df.duplicated(subset=['raceId', 'driverId'], keep='first')
         duplicates_count = df['is_duplicate'].sum()
@@ -131,7 +132,7 @@ def import_data_sqlite():
                 'points': df_primary['points'],
                 'fastest_lap': df_primary['fastestLapTime'].apply(lambda x: None if pd.isna(x) else str(x)),
                 'laps_completed': df_primary['laps'],
-                'status': df_primary['statusId'].map(status_dict),
+                'status': df_primary['statusId'].map(status_lookup),
                 'session_type': 'race'
             })
             df_result.to_sql('Result', conn, if_exists='append', index=False)
@@ -174,7 +175,7 @@ def import_data_sqlite():
                     'points': df_additional['points'],
                     'fastest_lap': df_additional['fastestLapTime'].apply(lambda x: None if pd.isna(x) else str(x)),
                     'laps_completed': df_additional['laps'],
-                    'status': df_additional['statusId'].map(status_dict),
+                    'status': df_additional['statusId'].map(status_lookup),
                     'session_type': df_additional['session_type_calc'],
                     'entry_sequence': df_additional['entry_sequence'],
                     'notes': 'Duplicate entry from original CSV'
@@ -195,7 +196,7 @@ def import_data_sqlite():
                 'points': df['points'],
                 'fastest_lap': df['fastestLapTime'].apply(lambda x: None if pd.isna(x) else str(x)),
                 'laps_completed': df['laps'],
-                'status': df['statusId'].map(status_dict),
+                'status': df['statusId'].map(status_lookup),
                 'session_type': 'race'
             })
             df_result.to_sql('Result', conn, if_exists='append', index=False)
@@ -254,10 +255,12 @@ def import_data_sqlite():
         print("DATA IMPORT SUMMARY")
         print("="*50)
         
+        # All record counts in one statement instead of one query per table
         tables = ['Status', 'Team', 'Driver', 'Circuit', 'Race', 'Result', 'Additional_Results']
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
+        cursor.execute(" UNION ALL ".join(
+            f"SELECT '{table}', COUNT(*) FROM {table}" for table in tables
+        ))
+        for table, count in cursor.fetchall():
             print(f"{table:20s}: {count:>6,} records")
         
         # Show breakdown of additional results by type
@@ -441,6 +444,11 @@ def create_tables_sqlite(cursor):
     cursor.execute("CREATE INDEX idx_result_race ON Result(race_id)")
     cursor.execute("CREATE INDEX idx_result_driver ON Result(driver_id)")
     cursor.execute("CREATE INDEX idx_result_team ON Result(team_id)")
+    cursor.execute("CREATE INDEX idx_result_driver_race ON Result(driver_id, race_id)")
+    cursor.execute("CREATE INDEX idx_result_driver_pos ON Result(driver_id, position, race_id)")
+    cursor.execute("CREATE INDEX idx_result_driver_team ON Result(driver_id, team_id, race_id)")
+    cursor.execute("CREATE INDEX idx_result_race_team ON Result(race_id, team_id, driver_id)")
+    cursor.execute("CREATE INDEX idx_race_id_date ON Race(race_id, race_date)")
     cursor.execute("CREATE INDEX idx_additional_race ON Additional_Results(race_id)")
     cursor.execute("CREATE INDEX idx_additional_driver ON Additional_Results(driver_id)")
     cursor.execute("CREATE INDEX idx_additional_original ON Additional_Results(original_result_id)")
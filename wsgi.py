@@ -0,0 +1,14 @@
+"""
+WSGI entry point for running the F1 ELO web application under a
+production server, e.g.:
+
+    gunicorn -k gthread -w 4 --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Each worker thread keeps its own read-only SQLite connection and the
+database runs in WAL mode, so concurrent requests read in parallel.
+"""
+
+from app import app
+
+if __name__ == '__main__':
+    app.run()